@@ -0,0 +1,59 @@
+import io
+import vinyl.ast as ast
+import vinyl.lex as lex
+
+from .. import text
+from ..patch import unittest
+from .serialize import shape
+
+
+class TestNodeArena(unittest.TestCase):
+    source = text + '\ndef f(a Int, b Float) Int {\n    ;\n    let c Int\n}\n'
+
+    def test_slots(self):
+        for node in ast.Parser.from_stream(lex.StringStream(self.source)).parse():
+            self.assertFalse(hasattr(node, '__dict__'))
+
+    @staticmethod
+    def serialize(nodes) -> bytes:
+        f = io.BytesIO()
+        with ast.AstWriter(f) as writer:
+            for node in nodes:
+                writer.write(node)
+        return f.getvalue()
+
+    def test_matches_parse(self):
+        arena = ast.NodeArena()
+        nodes = ast.Parser.from_stream(lex.StringStream(self.source), arena=arena).parse()
+        expected = ast.Parser.from_stream(lex.StringStream(self.source)).parse()
+        self.assertEqual(shape(list(ast.AstReader(self.serialize(nodes)))), shape(expected))
+        self.assertIsInstance(nodes[-1], ast.FunctionDefinitionNode)
+        self.assertIsInstance(nodes[-1].return_type, ast.TypeNameNode)
+        self.assertIsNone(nodes[-1].block[0])
+        self.assertEqual(len(arena), 48)
+
+    def test_tokens(self):
+        arena = ast.NodeArena()
+        istream = lex.StringStream(self.source)
+        nodes = ast.Parser.from_stream(istream, arena=arena).parse()
+        expected = ast.Parser.from_stream(lex.StringStream(self.source)).parse()
+        self.assertIs(arena.tokens.istream, istream)
+        token, other = nodes[-1].arguments[1].type_name.identifier, expected[-1].arguments[1].type_name.identifier
+        self.assertEqual((token.text, token.start_location.line, token.start_location.column),
+                         (other.text, other.start_location.line, other.start_location.column))
+        with self.assertRaises(ValueError):
+            ast.Parser.from_stream(lex.StringStream(self.source), arena=arena)
+
+    def test_serialize(self):
+        nodes = ast.Parser.from_stream(lex.StringStream(self.source), arena=ast.NodeArena()).parse()
+        expected = ast.Parser.from_stream(lex.StringStream(self.source)).parse()
+        self.assertEqual(self.serialize(nodes), self.serialize(expected))
+
+    def test_equality(self):
+        names = lex.InternTable()
+        nodes = ast.Parser.from_stream(lex.StringStream(self.source), names=names, arena=ast.NodeArena()).parse()
+        expected = ast.Parser.from_stream(lex.StringStream(self.source), names=names).parse()
+        self.assertEqual(nodes[0].identifier, expected[0].identifier)
+        self.assertEqual(expected[0].type_name, nodes[0].type_name)
+        self.assertNotEqual(nodes[0].identifier, expected[0].type_name)
+        self.assertEqual(len({nodes[0].identifier, expected[0].identifier}), 1)
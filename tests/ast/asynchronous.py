@@ -0,0 +1,51 @@
+import asyncio
+import vinyl.ast as ast
+import vinyl.lex as lex
+
+from .. import text
+from ..lex.lex import ChunkReader
+from ..patch import unittest
+from .serialize import shape
+
+
+class TestAsyncParser(unittest.TestCase):
+    @staticmethod
+    def collect(parser: ast.AsyncParser):
+        async def run():
+            nodes = []
+            while True:
+                try:
+                    nodes.append(await parser.__anext__())
+                except StopAsyncIteration:
+                    return nodes
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+    def assertParses(self, source: str):
+        try:
+            expected = shape(ast.Parser.from_stream(lex.StringStream(source)).parse())
+        except lex.SyntacticalError as e:
+            expected = e
+        for size in [1, 5, 4096]:
+            parser = ast.AsyncParser(ChunkReader(source.encode('utf-8'), size), chunk_size=size)
+            if isinstance(expected, lex.SyntacticalError):
+                with self.assertRaises(lex.SyntacticalError) as context:
+                    self.collect(parser)
+                self.assertEqual(context.exception.message, expected.message)
+                self.assertEqual(context.exception.token.start_location.offset,
+                                 expected.token.start_location.offset)
+            else:
+                self.assertEqual(shape(self.collect(parser)), expected)
+
+    def test_declarations(self):
+        self.assertParses(text)
+        self.assertParses(text + ';;\ndef f(a Int) Int { let b Int = 1 }')
+        self.assertParses('')
+
+    def test_errors(self):
+        self.assertParses(text + '\ndef 3() {}')
+        self.assertParses(text + '\nlet x Int = 0xZZ')
+        self.assertParses('def f() { let x Int = 1 def g() {}')
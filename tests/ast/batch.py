@@ -0,0 +1,148 @@
+import os
+import tempfile
+import vinyl.ast as ast
+import vinyl.lex as lex
+
+from .. import text
+from ..patch import unittest
+from .serialize import shape
+
+
+class TestParseFiles(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._paths = []
+        for index, source in enumerate([text, 'let x Int = 1\ndef 3() {}\n', text]):
+            path = os.path.join(self._directory.name, '{}.vinyl'.format(index))
+            with open(path, 'w') as f:
+                f.write(source)
+            self._paths.append(path)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_process_pool(self):
+        names = lex.InternTable()
+        results = ast.parse_files(self._paths, workers=2, names=names)
+        self.assertEqual([result.path for result in results], self._paths)
+        self.assertEqual(len(results[0].nodes), 3)
+        self.assertIsNone(results[0].diagnostic)
+        first, second = results[0].nodes[0], results[2].nodes[0]
+        self.assertIs(first.identifier.identifier.text, second.identifier.identifier.text)
+        self.assertEqual(first.identifier, second.identifier)
+        self.assertEqual(names.get('CONSTANT1'), first.identifier.name_id)
+        self.assertEqual(first.identifier.identifier.start_location.line, 4)
+        self.assertEqual(first.identifier.identifier.start_location.column, 9)
+
+    def test_diagnostics(self):
+        for workers in [1, 2]:
+            diagnostic = ast.parse_files(self._paths, workers=workers)[1].diagnostic
+            self.assertEqual((diagnostic.line, diagnostic.column), (2, 5))
+            self.assertEqual(diagnostic.line_text, 'def 3() {}')
+            self.assertIn('not a valid function name', str(diagnostic))
+
+    def test_unreadable_files(self):
+        path = os.path.join(self._directory.name, 'latin1.vinyl')
+        with open(path, 'wb') as f:
+            f.write('let é Int'.encode('latin-1'))
+        paths = [self._paths[0], os.path.join(self._directory.name, 'missing.vinyl'), path]
+        for workers in [1, 2]:
+            results = ast.parse_files(paths, workers=workers)
+            self.assertEqual(len(results[0].nodes), 3)
+            for result in results[1:]:
+                self.assertIsNone(result.nodes)
+                self.assertEqual(result.diagnostic.line, 0)
+                self.assertTrue(str(result.diagnostic).startswith(result.path + ': Read Error'))
+            self.assertIn('No such file', results[1].diagnostic.message)
+
+    def test_token_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lex.TokenCache(directory)
+            for workers in [1, 2, 1]:
+                results = ast.parse_files(self._paths, workers=workers, cache=cache)
+                self.assertEqual(len(results[2].nodes), 3)
+                self.assertEqual(results[1].diagnostic.line_text, 'def 3() {}')
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_cached_diagnostics(self):
+        path = os.path.join(self._directory.name, 'errors.vinyl')
+        with open(path, 'w') as f:
+            f.write('def 3() {}\nlet x Int = 0xZZ\n')
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lex.TokenCache(directory)
+            expected = ast.parse_file(path).diagnostic
+            diagnostic = ast.parse_file(path, cache=cache).diagnostic
+            self.assertEqual((diagnostic.message, diagnostic.line, diagnostic.column),
+                             (expected.message, expected.line, expected.column))
+            self.assertIn('not a valid function name', diagnostic.message)
+
+    def test_cached_options(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lex.TokenCache(directory)
+            for _ in range(2):
+                nodes = ast.parse_file(self._paths[0], cache=cache, lazy_bodies=True).nodes
+                self.assertTrue(callable(nodes[2]._block))
+                self.assertEqual(shape(nodes), shape(ast.parse_file(self._paths[0]).nodes))
+
+    def test_cached_lexer_type(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lex.TokenCache(directory)
+            for lexer_type in [lex.Lexer, lex.RegexLexer]:
+                nodes = ast.parse_file(self._paths[0], cache=cache, lexer_type=lexer_type).nodes
+                self.assertEqual(shape(nodes), shape(ast.parse_file(self._paths[0]).nodes))
+            diagnostic = ast.parse_file(self._paths[1], cache=cache, lexer_type=lex.RegexLexer).diagnostic
+            self.assertEqual(diagnostic.line_text, 'def 3() {}')
+
+    def test_cached_lazy_literals(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = lex.TokenCache(directory)
+            for lazy in [True, False, True]:
+                nodes = ast.parse_file(self._paths[0], cache=cache, lazy_literals=lazy).nodes
+                self.assertEqual(nodes[0].value.literal.decoded, not lazy)
+                self.assertEqual(nodes[0].value.literal.value, 4)
+
+    def test_cached_trivia(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                ast.parse_file(self._paths[0], cache=lex.TokenCache(directory), trivia=True)
+
+
+class TestParseFileParallel(unittest.TestCase):
+    source = (text + 'def f(é Int) Int { let b Int = é + 1 } let c Int = f(2)\n/* let x */ // def y\n') * 8
+
+    def assertMatchesSequential(self, source: str, chunk_size: int=64):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'huge.vinyl')
+            with open(path, 'wb') as f:
+                f.write(source.encode('utf-8'))
+            try:
+                expected = shape(ast.Parser.from_stream(lex.StringStream(source)).parse())
+            except lex.SyntacticalError as e:
+                expected = e
+            if isinstance(expected, lex.SyntacticalError):
+                with self.assertRaises(lex.SyntacticalError) as context:
+                    ast.parse_file_parallel(path, workers=2, chunk_size=chunk_size)
+                error = context.exception
+                self.assertEqual(error.message, expected.message)
+                for attribute in ['line', 'column', 'offset']:
+                    self.assertEqual(getattr(error.token.start_location, attribute),
+                                     getattr(expected.token.start_location, attribute))
+            else:
+                self.assertEqual(shape(ast.parse_file_parallel(path, workers=2, chunk_size=chunk_size)), expected)
+
+    def test_split_points(self):
+        data = b'let a Int\ndef f() { let b Int }\n/* let c */ // def d\nletx\nlet e Int'
+        self.assertEqual(ast.split_points(data, 1), [0, 10, data.index(b'let e')])
+        self.assertEqual(ast.split_points(data, 20), [0, data.index(b'let e')])
+
+    def test_matches_sequential(self):
+        self.assertMatchesSequential(self.source)
+
+    def test_comment_edge_cases(self):
+        self.assertMatchesSequential('let a Int = b /*/ // */ let c Int\nlet d Int\n', chunk_size=1)
+        self.assertMatchesSequential('let a Int /* let b Int', chunk_size=1)
+
+    def test_first_error(self):
+        middle = len(self.source) // 2
+        self.assertMatchesSequential(self.source[:middle] + '\nlet x Int = 1 +\n' + self.source[middle:])
+        self.assertMatchesSequential(self.source[:middle] + '\ndef 1() {}\n' + self.source[middle:] + 'def 2() {}')
@@ -0,0 +1,68 @@
+import vinyl.ast as ast
+import vinyl.lex as lex
+
+from .. import text
+from ..patch import unittest
+from .serialize import shape
+
+
+class TestSyntaxTree(unittest.TestCase):
+    source = text + '\ndef g(a Int) Int { let b Int = a + 1 /* c */ }\n;let z Float = 1.5e3\n'
+
+    def assertEdited(self, tree: ast.SyntaxTree, start: int, end: int, replacement: str) -> ast.SyntaxTree:
+        source = tree.istream.string
+        edited = tree.edit(start, end, replacement)
+        expected = ast.Parser.from_stream(lex.StringStream(source[:start] + replacement + source[end:])).parse()
+        self.assertEqual(shape(edited.nodes), shape(expected))
+        return edited
+
+    def test_reuses_unchanged_nodes(self):
+        tree = ast.SyntaxTree.parse(self.source)
+        nodes = list(tree._nodes)
+        offset = self.source.index('a + 1') + 4
+        edited = self.assertEdited(tree, offset, offset + 1, '2 * 3')
+        self.assertIs(edited[0], nodes[0])
+        self.assertIsNot(edited[3], nodes[3])
+        self.assertIs(edited[4], nodes[4])
+        location = edited[4].identifier.identifier.start_location
+        self.assertEqual((location.line, location.offset), (21, offset + 21))
+        self.assertEqual(edited.spans[-1][1], len(edited.istream.string))
+
+    def test_edits(self):
+        tree = ast.SyntaxTree.parse(self.source)
+        tree = self.assertEdited(tree, 0, 0, 'let q Int = 1\n\n')
+        offset = tree.istream.string.index('def main')
+        tree = self.assertEdited(tree, offset, offset, 'def h() {}\n')
+        # Removing a closing brace merges the function with the declarations after it
+        offset = tree.istream.string.index('/* c */ }') + 8
+        source = tree.istream.string
+        with self.assertRaises(lex.SyntacticalError):
+            tree.edit(offset, offset + 1, '')
+        self.assertEqual(tree.istream.string, source)
+        self.assertEqual(len(tree.tokens), len(lex.tokenize_all(lex.StringStream(source))))
+        tree = self.assertEdited(tree, offset, offset + 1, '} def k() {}')
+        tree = self.assertEdited(tree, len(tree.istream.string), len(tree.istream.string), 'let t Int')
+
+    def assertSameError(self, tree: ast.SyntaxTree, start: int, end: int, replacement: str):
+        source = tree.istream.string
+        with self.assertRaises(lex.SyntacticalError) as expected:
+            ast.Parser.from_stream(lex.StringStream(source[:start] + replacement + source[end:])).parse()
+        with self.assertRaises(lex.SyntacticalError) as context:
+            tree.edit(start, end, replacement)
+        self.assertEqual(context.exception.message, expected.exception.message)
+        token, other = context.exception.token, expected.exception.token
+        self.assertEqual(token is None, other is None)
+        if token is not None:
+            self.assertEqual(token.start_location.offset, other.start_location.offset)
+        self.assertEqual(tree.istream.string, source)
+
+    def test_errors(self):
+        tree = ast.SyntaxTree.parse(self.source)
+        end = len(self.source)
+        offset = self.source.index('def g')
+        self.assertSameError(tree, end, end, 'def f(')
+        self.assertSameError(tree, offset, offset, 'def h() { if a { ')
+        self.assertSameError(tree, offset, offset, 'let x Int = 1 */ 0xZZ')
+        offset = self.source.index('/* c */ }') + 8
+        self.assertSameError(tree, offset, offset + 1, '')
+        self.assertEqual(shape(tree.nodes), shape(ast.Parser.from_stream(lex.StringStream(self.source)).parse()))
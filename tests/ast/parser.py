@@ -0,0 +1,139 @@
+import vinyl.ast as ast
+import vinyl.lex as lex
+
+from .. import text
+from ..patch import unittest
+from .serialize import shape
+
+
+class TestIterParse(unittest.TestCase):
+    def test_matches_parse(self):
+        nodes = ast.Parser.from_stream(lex.StringStream(text)).iter_parse()
+        self.assertEqual(shape(list(nodes)), shape(ast.Parser.from_stream(lex.StringStream(text)).parse()))
+
+    def test_incremental(self):
+        source = 'let x Int = 1\n;\nlet y Int = 2\ndef 3() {}'
+        nodes = ast.Parser.from_stream(lex.StringStream(source)).iter_parse()
+        self.assertEqual(next(nodes).identifier.identifier.text, 'x')
+        self.assertEqual(next(nodes).identifier.identifier.text, 'y')
+        with self.assertRaises(lex.SyntacticalError):
+            next(nodes)
+
+
+class TestExpressions(unittest.TestCase):
+    @staticmethod
+    def expression(source: str):
+        return ast.Parser.from_stream(lex.StringStream('let x Int = ' + source)).parse()[0].value
+
+    @classmethod
+    def show(cls, node) -> str:
+        if isinstance(node, ast.LiteralNode):
+            return node.literal.text
+        if isinstance(node, ast.ReferenceNode):
+            return node.identifier.identifier.text
+        if isinstance(node, ast.UnaryOperationNode):
+            return '({}{})'.format(node.operator.text, cls.show(node.operand))
+        if isinstance(node, ast.BinaryOperationNode):
+            return '({} {} {})'.format(cls.show(node.left), node.operator.text, cls.show(node.right))
+        if isinstance(node, ast.CallNode):
+            return '{}({})'.format(cls.show(node.callee), ', '.join(cls.show(arg) for arg in node.arguments))
+        return '{}[{}]'.format(cls.show(node.target), cls.show(node.subscript))
+
+    def test_precedence(self):
+        for source, expected in [('1 + 2 * 3', '(1 + (2 * 3))'),
+                                 ('a - b - c', '((a - b) - c)'),
+                                 ('a = b = c < d', '(a = (b = (c < d)))'),
+                                 ('-a.b::c', '(-((a . b) :: c))'),
+                                 ('(1 + 2) * -(3)', '((1 + 2) * (-3))'),
+                                 ('!x[1][2]', '(!x[1][2])'),
+                                 ('-f(1, g(2)[3] + 4)()', '(-f(1, (g(2)[3] + 4))())')]:
+            self.assertEqual(self.show(self.expression(source)), expected)
+
+    def test_conditions(self):
+        node = ast.Parser.from_stream(lex.StringStream('def f() { if a < 1 { } }')).parse()[0]
+        self.assertEqual(self.show(node.block[0].expression), '(a < 1)')
+
+    def test_errors(self):
+        for source, token, message in [('1 +', '+', 'Expected an expression after "+"'),
+                                       ('(1 + 2', '(', 'Expected ")" to close "("'),
+                                       ('a[1)', ')', 'Expected "]" to close "[", found symbol: ")"'),
+                                       ('* 2', '*', 'Expected an expression, found symbol: "*"')]:
+            with self.assertRaises(lex.SyntacticalError) as context:
+                self.expression(source)
+            self.assertEqual((context.exception.token.text, context.exception.message), (token, message))
+
+    def test_deep_nesting(self):
+        depth = 20000
+        for source in ['(' * depth + '1' + ')' * depth, '-' * depth + '1', ' = '.join(['a'] * depth)]:
+            node = self.expression(source)
+            while not isinstance(node, (ast.LiteralNode, ast.ReferenceNode)):
+                node = node.operand if isinstance(node, ast.UnaryOperationNode) else node.right
+
+
+class TestLazyBodies(unittest.TestCase):
+    source = text + '\ndef broken(a Int) Int {\n    let b Int = a +\n}\ndef f() { if a { let c Int = 1 } }\n'
+
+    def test_deferred(self):
+        nodes = ast.Parser.from_stream(lex.StringStream(self.source), lazy_bodies=True).parse()
+        self.assertEqual([node.identifier.identifier.text for node in nodes[2:]], ['main', 'broken', 'f'])
+        self.assertTrue(callable(nodes[4]._block))
+        block = nodes[4].block
+        self.assertIs(nodes[4].block, block)
+        self.assertIsInstance(block[0], ast.IfStatementNode)
+        eager = ast.Parser.from_stream(lex.StringStream(text)).parse()
+        self.assertEqual(shape(nodes[:3]), shape(eager))
+
+    def test_errors_when_forced(self):
+        nodes = ast.Parser.from_stream(lex.StringStream(self.source), lazy_bodies=True).parse()
+        with self.assertRaises(lex.SyntacticalError) as context:
+            nodes[3].block
+        with self.assertRaises(lex.SyntacticalError) as expected:
+            ast.Parser.from_stream(lex.StringStream(self.source)).parse()
+        self.assertEqual(context.exception.message, expected.exception.message)
+        self.assertEqual(context.exception.token.start_location.offset, expected.exception.token.start_location.offset)
+
+    def test_unclosed_body(self):
+        for source in ['def f() { let a Int', 'def f() { /* } */ let a Int', 'def f() { let a Int = 0xZZ']:
+            with self.assertRaises(lex.SyntacticalError):
+                ast.Parser.from_stream(lex.StringStream(source), lazy_bodies=True).parse()
+
+    def test_lexer_errors_when_forced(self):
+        source = 'def f() { let a Int = 0xZZ }\nlet b Int\n'
+        for lexer_type in [lex.Lexer, lex.RegexLexer]:
+            nodes = ast.Parser.from_stream(lex.StringStream(source), lexer_type, lazy_bodies=True).parse()
+            self.assertEqual(len(nodes), 2)
+            with self.assertRaises(lex.SyntacticalError) as context:
+                nodes[0].block
+            self.assertEqual(context.exception.token.text, '0xZZ')
+
+    def test_relexed_locations(self):
+        source = 'def f() {\n    // }\n    /* { */ let a Int = 1 /*/\n}\nlet b Int\n'
+        for lexer_type in [lex.Lexer, lex.RegexLexer]:
+            parser = ast.Parser.from_stream(lex.StringStream(source), lexer_type, lazy_bodies=True)
+            nodes = parser.iter_parse()
+            block = next(nodes).block
+            location = block[0].identifier.identifier.start_location
+            self.assertEqual((location.line, location.column), (3, 17))
+            location = next(nodes).identifier.identifier.start_location
+            self.assertEqual((location.line, location.column), (5, 5))
+
+
+class TestIdentifierEquality(unittest.TestCase):
+    @staticmethod
+    def declaration(source: str, names: lex.InternTable=None) -> ast.VariableDeclarationNode:
+        return ast.Parser.from_stream(lex.StringStream(source), names=names).parse()[0]
+
+    def test_separate_tables(self):
+        first, second = self.declaration('let x Int'), self.declaration('let y Float')
+        self.assertEqual(first.identifier.name_id, second.identifier.name_id)
+        self.assertNotEqual(first.identifier, second.identifier)
+        self.assertNotEqual(first.type_name, second.type_name)
+        self.assertEqual(first.type_name, self.declaration('let z Int').type_name)
+        self.assertEqual(len({first.identifier, second.identifier, self.declaration('let x Int').identifier}), 2)
+
+    def test_shared_table(self):
+        names = lex.InternTable()
+        first, second = self.declaration('let x Int', names), self.declaration('let x Float', names)
+        self.assertEqual(first.identifier, second.identifier)
+        self.assertEqual(hash(first.identifier), hash(second.identifier))
+        self.assertNotEqual(first.type_name, second.type_name)
@@ -0,0 +1,91 @@
+import io
+import os
+import tempfile
+import vinyl.ast as ast
+import vinyl.lex as lex
+
+from .. import text
+from ..patch import unittest
+
+
+def shape(value):
+    if isinstance(value, list):
+        return [shape(item) for item in value]
+    if isinstance(value, lex.BaseToken):
+        locations = value.start_location, value.end_location
+        return type(value), value.text, [(l.line, l.column, l.offset) for l in locations]
+    if isinstance(value, ast.IdentifierNode):
+        return type(value), shape(value.identifier)
+    if isinstance(value, ast.ArgumentNode):
+        return type(value), shape(value.identifier), shape(value.type_name)
+    if isinstance(value, ast.VariableDeclarationNode):
+        return type(value), shape(value.identifier), shape(value.type_name), shape(value.value)
+    if isinstance(value, ast.IfStatementNode):
+        return type(value), shape(value.expression), shape(value.when_true), shape(value.when_false)
+    if isinstance(value, ast.LiteralNode):
+        return type(value), shape(value.literal)
+    if isinstance(value, ast.ReferenceNode):
+        return type(value), shape(value.identifier)
+    if isinstance(value, ast.UnaryOperationNode):
+        return type(value), shape(value.operator), shape(value.operand)
+    if isinstance(value, ast.BinaryOperationNode):
+        return type(value), shape(value.operator), shape(value.left), shape(value.right)
+    if isinstance(value, ast.CallNode):
+        return type(value), shape(value.callee), shape(value.arguments)
+    if isinstance(value, ast.IndexNode):
+        return type(value), shape(value.target), shape(value.subscript)
+    if isinstance(value, ast.FunctionDefinitionNode):
+        return (type(value), shape(value.identifier), shape(value.arguments),
+                shape(value.return_type), shape(value.block))
+    return value
+
+
+class TestAstSerialization(unittest.TestCase):
+    source = text + '\ndef f(a Int, b Float) Int {\n    let é Int = -a.b(1, c[2]) * 3\n}\n'
+
+    def setUp(self):
+        self._tree = ast.Parser.from_stream(lex.StringStream(self.source)).parse()
+
+    def test_round_trip(self):
+        f = io.BytesIO()
+        with ast.AstWriter(f) as writer:
+            for node in self._tree:
+                writer.write(node)
+        reader = ast.AstReader(f.getvalue())
+        self.assertEqual(len(reader), len(self._tree))
+        self.assertEqual(shape(list(reader)), shape(self._tree))
+        self.assertIs(reader[-1], reader[len(reader) - 1])
+
+    def test_mmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tree.vast')
+            with open(path, 'wb') as f, ast.AstWriter(f) as writer:
+                for node in self._tree:
+                    writer.write(node)
+            names = lex.InternTable()
+            with ast.AstReader.from_file(path, names) as reader:
+                function = reader[-1]
+                self.assertEqual(shape(function), shape(self._tree[-1]))
+                self.assertEqual(function.arguments[1].type_name.name_id, names.get('Float'))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ast.AstReader(b'VAST')
+        with self.assertRaises(ValueError):
+            ast.AstReader(b'\0' * 64)
+        f = io.BytesIO()
+        with ast.AstWriter(f) as writer:
+            writer.write(self._tree[0])
+        with self.assertRaises(ValueError):
+            ast.AstReader(f.getvalue()[:-8])
+
+    def test_streaming(self):
+        f = io.BytesIO()
+        writer = ast.AstWriter(f)
+        sizes = []
+        for node in self._tree:
+            writer.write(node)
+            sizes.append(len(f.getvalue()))
+        self.assertEqual(sizes, sorted(set(sizes)))
+        writer.close()
+        self.assertEqual(shape(list(ast.AstReader(f.getvalue()))), shape(self._tree))
@@ -0,0 +1,164 @@
+import os
+import tempfile
+from typing import List, Tuple
+from unittest import mock
+import vinyl.lex as lex
+
+from .. import text
+from ..patch import unittest
+
+
+class TestTokenBuffer(unittest.TestCase):
+    def setUp(self):
+        self._buffer = lex.tokenize_all(lex.StringStream(text))
+        self._tokens = list(lex.Lexer(lex.StringStream(text)))
+
+    def test_matches_lexer(self):
+        self.assertEqual(len(self._buffer), len(self._tokens))
+        self.assertEqual(list(self._buffer), self._tokens)
+        for index, token in enumerate(self._tokens):
+            self.assertEqual(self._buffer.start(index), token.start_location.offset)
+            self.assertEqual(self._buffer.end(index), token.end_location.offset)
+            self.assertIs(self._buffer.token_type(index), type(token))
+
+    def test_random_access(self):
+        token = self._buffer[-1]
+        self.assertEqual(token, self._tokens[-1])
+        self.assertEqual(token.start_location.line, self._tokens[-1].start_location.line)
+        self.assertEqual(token.start_location.column, self._tokens[-1].start_location.column)
+        self.assertIs(self._buffer.kind(1), lex.KeywordTokenKind.LET)
+
+    def test_slicing(self):
+        buffer = self._buffer[1:5]
+        self.assertIsInstance(buffer, lex.TokenBuffer)
+        self.assertEqual(list(buffer), self._tokens[1:5])
+        self.assertEqual(buffer.text(1), 'CONSTANT1')
+
+    def test_malformed_tokens(self):
+        for bad in ['let x Int = 0xZZ', 'let x// Int', 'let x Int = /']:
+            with self.assertRaises(lex.SyntacticalError):
+                lex.tokenize_all(lex.StringStream(bad))
+
+
+class TestRelex(unittest.TestCase):
+    @staticmethod
+    def spans(buffer: lex.TokenBuffer) -> List[Tuple[type, str, int, int]]:
+        return [(buffer.token_type(i), buffer.text(i), buffer.start(i), buffer.end(i)) for i in range(len(buffer))]
+
+    def assertRelexed(self, buffer: lex.TokenBuffer, start: int, end: int, replacement: str) -> lex.TokenBuffer:
+        source = buffer.istream.string
+        relexed = lex.relex(buffer, start, end, replacement)
+        expected = lex.tokenize_all(lex.StringStream(source[:start] + replacement + source[end:]))
+        self.assertEqual(self.spans(relexed), self.spans(expected))
+        last = relexed[-1]
+        self.assertEqual(last.start_location.line, expected[-1].start_location.line)
+        self.assertEqual(last.start_location.column, expected[-1].start_location.column)
+        return relexed
+
+    def test_edits(self):
+        buffer = lex.tokenize_all(lex.StringStream(text))
+        buffer = self.assertRelexed(buffer, text.index('42'), text.index('42') + 2, '1_000')
+        buffer = self.assertRelexed(buffer, 0, 0, 'let y Int\n')
+        buffer = self.assertRelexed(buffer, len(buffer.istream.string), len(buffer.istream.string), ' def')
+        source = buffer.istream.string
+        self.assertRelexed(buffer, source.index('x {'), source.index('x {') + 1, 'CONSTANT1')
+
+    def test_block_comments(self):
+        buffer = lex.tokenize_all(lex.StringStream(text))
+        start = text.index('let x')
+        buffer = self.assertRelexed(buffer, start, start, '/* ')
+        source = buffer.istream.string
+        end = source.index('if x {}')
+        buffer = self.assertRelexed(buffer, end, end, '*/ ')
+        source = buffer.istream.string
+        self.assertRelexed(buffer, source.index('*/ if x {}'), source.index('*/ if x {}') + 3, '')
+
+    def test_many_edits(self):
+        buffer = lex.tokenize_all(lex.StringStream(text))
+        buffer[-1].end_location.line
+        for index in range(300):
+            offset = buffer.start(index % len(buffer))
+            buffer = self.assertRelexed(buffer, offset, offset, '\n' if index % 2 else ' /* {} */ '.format(index))
+        source = buffer.istream.string
+        self.assertEqual(list(buffer.istream.line_map.values()), source.split('\n'))
+
+    def test_malformed_edit(self):
+        buffer = lex.tokenize_all(lex.StringStream(text))
+        spans = self.spans(buffer)
+        offset = text.index('42')
+        with self.assertRaises(lex.SyntacticalError):
+            lex.relex(buffer, offset, offset, '0xZZ')
+        self.assertEqual(self.spans(buffer), spans)
+        self.assertIs(buffer.istream.string, text)
+
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._cache = lex.TokenCache(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_round_trip(self):
+        source = (text + '\nlet ÿ Int = 1 // é\n').encode('utf-8')
+        self.assertIsNone(self._cache.load(source))
+        expected = self._cache.tokenize(source)
+        loaded = self._cache.load(source)
+        self.assertIsNotNone(loaded)
+        self.assertEqual(TestRelex.spans(loaded), TestRelex.spans(expected))
+        self.assertEqual(list(loaded), list(expected))
+        self.assertEqual(loaded[-1].start_location.line, expected[-1].start_location.line)
+
+    def test_relexed_buffer(self):
+        buffer = lex.relex(lex.tokenize_all(lex.StringStream(text)), 0, 0, 'let y Int\n')
+        source = buffer.istream.string.encode('utf-8')
+        self._cache.store(source, buffer)
+        self.assertEqual(TestRelex.spans(self._cache.load(source)), TestRelex.spans(buffer))
+
+    def test_buffer_lexer(self):
+        buffer = self._cache.tokenize(text.encode('utf-8'))
+        names = lex.InternTable()
+        tokens = list(lex.BufferLexer(buffer, skip_comments=True, names=names))
+        self.assertEqual(tokens, list(lex.Lexer(lex.StringStream(text), skip_comments=True)))
+        self.assertEqual(names.get('CONSTANT1'), tokens[1].name_id)
+
+    def test_truncated_entry(self):
+        source = text.encode('utf-8')
+        expected = TestRelex.spans(self._cache.tokenize(source))
+        path = os.path.join(self._directory.name, self._cache.key(source) + '.tokens')
+        for size in [60, os.path.getsize(path) - 1]:
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+            self.assertIsNone(self._cache.load(source))
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(TestRelex.spans(self._cache.tokenize(source)), expected)
+            self.assertEqual(TestRelex.spans(self._cache.load(source)), expected)
+
+    def test_eviction(self):
+        sources = [('let x{} Int = 1\n'.format(i) * 50).encode('utf-8') for i in range(4)]
+        paths = [os.path.join(self._directory.name, self._cache.key(source) + '.tokens') for source in sources]
+        self._cache.tokenize(sources[0])
+        os.utime(paths[0], (0, 0))
+        cache = lex.TokenCache(self._directory.name, max_size=os.path.getsize(paths[0]) * 2)
+        for i, source in enumerate(sources[1:], 1):
+            cache.tokenize(source)
+            os.utime(paths[i], (i, i))
+        self.assertIsNone(cache.load(sources[0]))
+        self.assertIsNone(cache.load(sources[1]))
+        self.assertIsNotNone(cache.load(sources[3]))
+        self.assertEqual(len(os.listdir(self._directory.name)), 2)
+
+    def test_incremental_eviction(self):
+        sources = [('let x{:02} Int = 1\n'.format(i) * 50).encode('utf-8') for i in range(12)]
+        self._cache.tokenize(sources[0])
+        size = os.path.getsize(os.path.join(self._directory.name, self._cache.key(sources[0]) + '.tokens'))
+        cache = lex.TokenCache(self._directory.name, max_size=size * 8)
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir:
+            for source in sources[1:]:
+                cache.tokenize(source)
+        # Listed once to learn the size of the existing entry, then only when a ninth entry passes max_size
+        # and eviction trims the directory back to six
+        self.assertEqual(listdir.call_count, 3)
+        self.assertEqual(len(os.listdir(self._directory.name)), 6)
+        self.assertIsNotNone(cache.load(sources[-1]))
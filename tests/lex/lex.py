@@ -1,7 +1,9 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import List
 import vinyl.lex as lex
 
+from .. import text
 from ..patch import unittest
 
 
@@ -21,20 +23,26 @@ class TestLexerBase(ABC, unittest.TestCase):
     def token_class() -> type(lex.BaseToken):
         return lex.BaseToken
 
+    @staticmethod
+    def lexer_types() -> List[type(lex.BaseLexer)]:
+        return [lex.Lexer, lex.RegexLexer]
+
     def test_good_inputs(self):
-        for good in self.good_inputs():
-            istream = lex.StringStream(good)
-            self.assertIsInstance(next(lex.Lexer(istream)), self.token_class())
+        for lexer_type in self.lexer_types():
+            for good in self.good_inputs():
+                istream = lex.StringStream(good)
+                self.assertIsInstance(next(lexer_type(istream)), self.token_class())
 
     def test_bad_inputs(self):
-        for bad in self.bad_inputs():
-            istream = lex.StringStream(bad)
-            try:
-                self.assertNotEqual(type(next(lex.Lexer(istream))), self.token_class())
-            except StopIteration:
-                self.assertTrue(istream.ended)
-            except Exception as e:
-                self.assertIsInstance(e, lex.SyntacticalError)
+        for lexer_type in self.lexer_types():
+            for bad in self.bad_inputs():
+                istream = lex.StringStream(bad)
+                try:
+                    self.assertNotEqual(type(next(lexer_type(istream))), self.token_class())
+                except StopIteration:
+                    self.assertTrue(istream.ended)
+                except Exception as e:
+                    self.assertIsInstance(e, lex.SyntacticalError)
 
 
 class TestIdentifierLexer(TestLexerBase):
@@ -91,6 +99,11 @@ class TestSymbolLexer(TestLexerBase):
     def token_class() -> type(lex.SymbolToken):
         return lex.SymbolToken
 
+    def test_longest_match(self):
+        for lexer_type in self.lexer_types():
+            tokens = list(lexer_type(lex.StringStream(':::')))
+            self.assertEqual([token.kind for token in tokens], [lex.SymbolTokenKind.SCOPE, lex.SymbolTokenKind.COLON])
+
 
 class TestIntegerLexer(TestLexerBase):
     @staticmethod
@@ -114,7 +127,11 @@ class TestIntegerLexer(TestLexerBase):
 class TestFloatLexer(TestLexerBase):
     @staticmethod
     def good_inputs() -> List[str]:
-        return []
+        return [
+            '1e3',
+            '1_0E+3',
+            '25e-3f32'
+        ]
 
     @staticmethod
     def bad_inputs() -> List[str]:
@@ -122,4 +139,179 @@ class TestFloatLexer(TestLexerBase):
 
     @staticmethod
     def token_class() -> type(lex.FloatToken):
-        return lex.FloatToken
\ No newline at end of file
+        return lex.FloatToken
+
+
+class TestRegexLexer(unittest.TestCase):
+    def test_matches_lexer(self):
+        expected = list(lex.Lexer(lex.StringStream(text)))
+        tokens = list(lex.RegexLexer(lex.StringStream(text)))
+        self.assertEqual(tokens, expected)
+        for token, other in zip(tokens, expected):
+            self.assertEqual(token.start_location.offset, other.start_location.offset)
+            self.assertEqual(token.end_location.offset, other.end_location.offset)
+
+    def test_unicode_starts(self):
+        for source in ['²', '٣4', 'ⅰx', '℘', 'éa', '_1', '9z']:
+            expected, tokens = [], []
+            for lexer_type, result in ((lex.Lexer, expected), (lex.RegexLexer, tokens)):
+                try:
+                    result.extend((type(token), token.text) for token in lexer_type(lex.StringStream(source)))
+                except lex.SyntacticalError as e:
+                    result.append(e.message)
+            self.assertEqual(tokens, expected)
+
+
+class TestLazyLiterals(unittest.TestCase):
+    def test_deferred_decoding(self):
+        for lexer_type in TestLexerBase.lexer_types():
+            token = next(lexer_type(lex.StringStream('0xBEEFi 2e3'), lazy_literals=True))
+            self.assertFalse(token.decoded)
+            self.assertEqual(token.value, 0xBEEF)
+            self.assertTrue(token.decoded)
+            self.assertIs(token.base, lex.IntegerBase.base16)
+            self.assertIs(token.kind, lex.IntegerKind.INT)
+
+    def test_malformed_literal(self):
+        for lexer_type in TestLexerBase.lexer_types():
+            with self.assertRaises(lex.SyntacticalError):
+                next(lexer_type(lex.StringStream('0xZZ'), lazy_literals=True))
+
+
+class TestCommentModes(unittest.TestCase):
+    def test_skip_comments(self):
+        for lexer_type in TestLexerBase.lexer_types():
+            expected = [token for token in lexer_type(lex.StringStream(text))
+                        if not isinstance(token, lex.CommentToken)]
+            tokens = list(lexer_type(lex.StringStream(text), skip_comments=True))
+            self.assertEqual(tokens, expected)
+            self.assertEqual([token.start_location.line for token in tokens],
+                             [token.start_location.line for token in expected])
+
+    def test_trivia(self):
+        for lexer_type in TestLexerBase.lexer_types():
+            lexer = lexer_type(lex.StringStream('  // first\nlet /* second */ x\n'), trivia=True)
+            tokens = list(lexer)
+            self.assertEqual([token.text for token in tokens], ['let', 'x'])
+            self.assertEqual([type(trivia) for trivia in tokens[0].leading_trivia],
+                             [lex.WhitespaceToken, lex.CommentToken, lex.WhitespaceToken])
+            self.assertEqual(tokens[1].leading_trivia[1].text, '/* second */')
+            self.assertEqual(''.join(trivia.text for trivia in lexer.trailing_trivia), '\n')
+
+
+class TestInterning(unittest.TestCase):
+    def test_shared_names(self):
+        names = lex.InternTable()
+        for lexer_type in TestLexerBase.lexer_types():
+            tokens = list(lexer_type(lex.StringStream('Int x Int'), names=names))
+            tokens += list(lexer_type(lex.StringStream(''.join(['I', 'nt'])), names=names))
+            self.assertIs(tokens[0].text, tokens[2].text)
+            self.assertIs(tokens[0].text, tokens[3].text)
+            self.assertEqual(tokens[0].name_id, tokens[3].name_id)
+            self.assertNotEqual(tokens[0].name_id, tokens[1].name_id)
+        self.assertEqual(len(names), 2)
+        self.assertEqual(names.name(names.get('x')), 'x')
+
+    def test_sub_lexers_share_names(self):
+        names = lex.InternTable()
+        lexer = lex.Lexer(lex.StringStream('let x Int = 1 + y'), names=names)
+        list(lexer)
+        self.assertIs(lexer.names, names)
+        self.assertEqual(len(names), 3)
+        self.assertIsNone(lex.NumberLexer(lex.StringStream('1'))._names)
+
+
+class TestPeekLexer(unittest.TestCase):
+    def setUp(self):
+        self._lexer = lex.PeekLexer.from_stream(lex.StringStream(text))
+        self._tokens = list(lex.Lexer(lex.StringStream(text), skip_comments=True))
+
+    def test_peek(self):
+        self.assertEqual(self._lexer.peek(), self._tokens[0])
+        self.assertEqual(self._lexer.peek(5), self._tokens[5])
+        self.assertIsNone(self._lexer.peek(len(self._tokens)))
+        self.assertEqual(list(self._lexer), self._tokens)
+        self.assertIsNone(self._lexer.peek())
+
+    def test_mark_reset(self):
+        self._lexer.read()
+        outer = self._lexer.mark()
+        self.assertEqual([self._lexer.read() for _ in range(3)], self._tokens[1:4])
+        inner = self._lexer.mark()
+        self._lexer.read()
+        self._lexer.reset(outer)
+        self.assertEqual(self._lexer.read(), self._tokens[1])
+        self._lexer.release(outer)
+        self._lexer.reset(inner)
+        self.assertEqual(self._lexer.read(), self._tokens[4])
+        self._lexer.release(inner)
+        self.assertEqual(len(self._lexer._tokens), 0)
+        with self.assertRaises(ValueError):
+            self._lexer.reset(outer)
+        self.assertEqual(list(self._lexer), self._tokens[5:])
+
+    def test_deferred_errors(self):
+        lexer = lex.PeekLexer.from_stream(lex.StringStream('let x Int = 0xZZ'))
+        self.assertEqual(lexer.peek(3).text, '=')
+        with self.assertRaises(lex.SyntacticalError):
+            lexer.peek(4)
+        self.assertEqual([lexer.read().text for _ in range(4)], ['let', 'x', 'Int', '='])
+        with self.assertRaises(lex.SyntacticalError):
+            lexer.read()
+
+
+class ChunkReader(object):
+    def __init__(self, data: bytes, size: int):
+        self._chunks = [data[i:i + size] for i in range(0, len(data), size)]
+
+    async def read(self, n: int=-1) -> bytes:
+        await asyncio.sleep(0)
+        return self._chunks.pop(0) if self._chunks else b''
+
+
+class TestAsyncLexer(unittest.TestCase):
+    source = text + 'let é Int = 0x1F // done\n/* trailing'
+
+    @staticmethod
+    def collect(lexer: lex.AsyncLexer) -> List[lex.BaseToken]:
+        async def run():
+            tokens = []
+            while True:
+                try:
+                    tokens.append(await lexer.__anext__())
+                except StopAsyncIteration:
+                    return tokens
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+    def test_chunks(self):
+        expected = list(lex.Lexer(lex.StringStream(self.source)))
+        for size in [1, 2, 3, 7, 1024]:
+            tokens = self.collect(lex.AsyncLexer(ChunkReader(self.source.encode('utf-8'), size), chunk_size=size))
+            self.assertEqual(tokens, expected)
+            for token, other in zip(tokens, expected):
+                self.assertEqual(token.start_location.line, other.start_location.line)
+                self.assertEqual(token.start_location.column, other.start_location.column)
+                self.assertEqual(token.end_location.offset, other.end_location.offset)
+
+    def test_errors(self):
+        reader = ChunkReader('let x Int = 0xZZ\nlet y Int'.encode('utf-8'), 2)
+        with self.assertRaises(lex.SyntacticalError):
+            self.collect(lex.AsyncLexer(reader, chunk_size=2))
+
+    def test_long_token(self):
+        scans = []
+
+        class CountingLexer(lex.Lexer):
+            def __next__(self):
+                scans.append(self._istream.offset)
+                return super().__next__()
+
+        source = 'let a Int /* ' + 'x' * 4096 + ' */ let b Int'
+        tokens = self.collect(lex.AsyncLexer(ChunkReader(source.encode('utf-8'), 4), lexer_type=CountingLexer,
+                                             chunk_size=4))
+        self.assertEqual(tokens, list(lex.Lexer(lex.StringStream(source))))
+        self.assertLess(scans.count(source.index('/*') - 1), 20)
@@ -1,5 +1,8 @@
+import io
+import pickle
+import tempfile
 from abc import ABC, abstractmethod
-from vinyl.lex import Location, StreamBase, StringStream
+from vinyl.lex import Location, Matcher, StreamBase, IOWrapperStream, StringStream, MmapStream, ReaderStream
 
 from ..patch import unittest
 
@@ -10,6 +13,10 @@ class TestLocation(unittest.TestCase):
         self.assertEqual(location.line, 1)
         self.assertEqual(location.column, 1)
 
+    def test_pickled_location(self):
+        location = pickle.loads(pickle.dumps(Location(3, 7, 42)))
+        self.assertEqual((location.line, location.column, location.offset), (3, 7, 42))
+
 
 class TestStreamBase(ABC, unittest.TestCase):
     @property
@@ -50,6 +57,30 @@ class TestStreamBase(ABC, unittest.TestCase):
         self.assertEqual(self.istream.line, 2)
         self.assertFalse(self.istream.ended)
 
+    def test_read_until_callable(self):
+        self.assertEqual(self.istream.read_until(lambda p, c: p == 'o' and c == ' '), 'hello')
+        self.assertEqual(self.istream.read_until(Matcher(r'\s*', lambda p, c: not c.isspace())), ' ')
+        self.assertEqual(self.istream.peek(), 'w')
+
+    def test_location(self):
+        self.istream.read(6)
+        location = self.istream.location
+        self.istream.read_until_exactly('!')
+        self.assertEqual(location.line, 1)
+        self.assertEqual(location.column, 7)
+        self.assertEqual(location.offset, 6)
+
+    def test_line_map(self):
+        self.istream.read_until_exactly('\n')
+        self.assertEqual(len(self.istream.line_map), 1)
+        self.istream.read(6)
+        self.assertEqual(self.istream.line_map[1], 'hello world')
+        self.assertEqual(self.istream.line_map[2], 'this is a test!')
+        self.assertNotIn(3, self.istream.line_map)
+        location = self.istream.location_at(self.istream.offset)
+        self.assertEqual(location.line, 2)
+        self.assertEqual(location.column, 6)
+
     def test_read_past_end(self):
         self.istream.read_until_exactly('!')
         c = self.istream.read(2)
@@ -67,3 +98,96 @@ class TestStringStream(TestStreamBase):
     @staticmethod
     def create_istream() -> StreamBase:
         return StringStream('hello world\nthis is a test!')
+
+
+class TestEditedStream(TestStreamBase):
+    @staticmethod
+    def create_istream() -> StreamBase:
+        return StringStream('hello there\nthis is a test!')._edit(6, 11, 'world')
+
+    def test_line_index(self):
+        self.istream.location_at(self.istream.string.index('test'))
+        edited = self.istream._edit(12, 12, 'first\nsecond\n')._edit(0, 0, '\n')
+        self.assertEqual(list(edited.line_map.values()), ['', 'hello world', 'first', 'second', 'this is a test!'])
+        location = edited.location_at(edited.string.index('test'))
+        self.assertEqual((location.line, location.column), (5, 11))
+
+
+class TestIOWrapperStream(TestStreamBase):
+    @staticmethod
+    def create_istream() -> StreamBase:
+        return IOWrapperStream(io.StringIO('hello world\nthis is a test!'))
+
+
+def create_mmap_stream(string: str) -> MmapStream:
+    with tempfile.TemporaryFile() as f:
+        f.write(string.encode('utf-8'))
+        f.flush()
+        return MmapStream(f)
+
+
+class TestMmapStream(TestStreamBase):
+    @staticmethod
+    def create_istream() -> StreamBase:
+        return create_mmap_stream('hello world\nthis is a test!')
+
+    def tearDown(self):
+        self.istream.close()
+
+    def test_read_multibyte(self):
+        istream = create_mmap_stream('let こんにちは = 1')
+        self.assertEqual(istream.read(4), 'let ')
+        self.assertEqual(istream.peek(2), 'こん')
+        self.assertEqual(istream.read_until_exactly(' '), 'こんにちは')
+        self.assertEqual(istream.column, 10)
+        self.assertEqual(istream.read(4), ' = 1')
+        self.assertTrue(istream.ended)
+        istream.close()
+
+    def test_columns_on_long_line(self):
+        string = 'é' * 1000 + 'x' * 1000 + 'こ' * 1000
+        istream = create_mmap_stream(string)
+        expected = {}
+        for index in range(0, len(string) + 1, 7):
+            expected[len(string[:index].encode('utf-8'))] = index + 1
+        for offset in sorted(expected) + sorted(expected, reverse=True):
+            self.assertEqual(istream.location_at(offset).column, expected[offset])
+        istream.close()
+
+    def test_empty_file(self):
+        istream = create_mmap_stream('')
+        self.assertTrue(istream.ended)
+        self.assertEqual(istream.peek(), '')
+
+
+class Pipe(object):
+    def __init__(self, data: bytes):
+        self._codeio = io.BytesIO(data)
+
+    def read(self, n: int=-1) -> bytes:
+        return self._codeio.read(n)
+
+
+class TestReaderStream(TestStreamBase):
+    @staticmethod
+    def create_istream() -> StreamBase:
+        return ReaderStream(Pipe('hello world\nthis is a test!'.encode('utf-8')), chunk_size=4)
+
+    def test_line_map(self):
+        self.istream.read_until_exactly('!')
+        self.assertNotIn(1, self.istream.line_map)
+        self.assertEqual(self.istream.line_map[2], 'this is a test!')
+
+    def test_seek_before_window(self):
+        istream = ReaderStream(Pipe(b'a\n' * 64), chunk_size=4)
+        istream.read(64)
+        self.assertEqual(istream.line, 33)
+        self.assertEqual(istream.line_map[33], 'a')
+        self.assertNotIn(1, istream.line_map)
+        with self.assertRaises(ValueError):
+            istream._set_offset(0)
+
+    def test_read_split_multibyte(self):
+        istream = ReaderStream(Pipe('こんにちは'.encode('utf-8')), chunk_size=1)
+        self.assertEqual(istream.read_until_exactly('!'), 'こんにちは')
+        self.assertTrue(istream.ended)
@@ -0,0 +1,27 @@
+import argparse
+import sys
+from vinyl import ast, lex
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='vinyl', description='The vinyl compiler')
+    parser.add_argument('paths', nargs='+', metavar='FILE', help='vinyl source files to parse')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=1,
+                        help='number of files handed to a worker at a time')
+    parser.add_argument('--token-cache', metavar='DIR', default=None,
+                        help='directory in which to cache the tokens of each source file')
+    args = parser.parse_args(argv)
+
+    cache = lex.TokenCache(args.token_cache) if args.token_cache else None
+    status = 0
+    for result in ast.parse_files(args.paths, workers=args.jobs, chunksize=args.chunk_size, cache=cache):
+        if result.diagnostic is not None:
+            print(result.diagnostic, file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,7 @@
 from ._parser import *
 from ._node import *
+from ._arena import *
+from ._batch import *
+from ._serialize import *
+from ._async import *
+from ._incremental import *
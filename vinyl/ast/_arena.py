@@ -0,0 +1,124 @@
+from array import array
+from numbers import Integral
+from typing import Any, List, Optional, Sized
+from vinyl.lex import *
+from ._node import *
+from ._node import _FIELDS, _NODE, _TOKEN
+
+__all__ = [
+    'NodeArena'
+]
+
+
+class NodeArena(Sized):
+    # Pseudo-kinds for absent optional children and for the head of a child list
+    _ABSENT, _SEQUENCE = 0, 1
+    _TYPES = [None, list] + list(_FIELDS)
+    _KINDS = {t: kind for kind, t in enumerate(_TYPES)}
+
+    @property
+    def tokens(self) -> Optional[TokenBuffer]:
+        return self._tokens
+
+    def __init__(self):
+        super().__init__()
+        self._kinds = array('B')
+        self._first_child = array('l')
+        self._next_sibling = array('l')
+        self._token_indices = array('l')
+        self._tokens = None
+        self._names = None
+
+    def _attach(self, istream: StreamBase, names: InternTable):
+        # Tokens are kept as offsets into the stream they were lexed from, so an arena holds a single stream
+        if self._tokens is None:
+            self._tokens = TokenBuffer(istream)
+            self._names = names
+        elif self._tokens.istream is not istream:
+            raise ValueError('A node arena only holds nodes parsed from one stream')
+
+    def _append(self, kind: Integral, children: List[Integral], token: Integral) -> Integral:
+        index = len(self._kinds)
+        self._kinds.append(kind)
+        self._first_child.append(children[0] if children else -1)
+        self._next_sibling.append(-1)
+        for child, sibling in zip(children, children[1:]):
+            self._next_sibling[child] = sibling
+        self._token_indices.append(token)
+        return index
+
+    def add_token(self, token: BaseToken) -> Integral:
+        kind = token.kind if isinstance(token, (KeywordToken, SymbolToken)) else None
+        self._tokens.append(type(token), kind, token.text, token.start_location.offset, token.end_location.offset)
+        return len(self._tokens) - 1
+
+    def add(self, node_type: type, *fields: Any) -> Integral:
+        # Tokens and child nodes are given by index, and child lists as lists of indices
+        children = []
+        token = -1
+        for (_, field_type), value in zip(_FIELDS[node_type], fields):
+            if field_type == _TOKEN:
+                token = value
+            elif field_type == _NODE:
+                children.append(self._index(value))
+            elif value is None:
+                children.append(self._append(self._ABSENT, [], -1))
+            else:
+                children.append(self._append(self._SEQUENCE, [self._index(item) for item in value], -1))
+        return self._append(self._KINDS[node_type], children, token)
+
+    def _index(self, node: Optional[Integral]) -> Integral:
+        if node is None:
+            return self._append(self._ABSENT, [], -1)
+        return node
+
+    def node(self, index: Integral) -> Optional[BaseNode]:
+        node_type = self._TYPES[self._kinds[index]]
+        if node_type is None:
+            return None
+        if node_type is list:
+            items = []
+            item = self._first_child[index]
+            while item != -1:
+                items.append(self.node(item))
+                item = self._next_sibling[item]
+            return items
+        view = _VIEWS[node_type].__new__(_VIEWS[node_type])
+        view._arena = self
+        view._index = index
+        return view
+
+    def _child(self, index: Integral, position: Integral) -> Any:
+        child = self._first_child[index]
+        for _ in range(position):
+            child = self._next_sibling[child]
+        return self.node(child)
+
+    def _token(self, index: Integral) -> BaseToken:
+        token = self._tokens[self._token_indices[index]]
+        if isinstance(token, IdentifierToken):
+            token.intern(self._names)
+        return token
+
+    def __len__(self) -> Integral:
+        return len(self._kinds)
+
+
+def _field(position: Integral, field_type: Integral) -> property:
+    if field_type == _TOKEN:
+        return property(lambda view: view._arena._token(view._index))
+    return property(lambda view: view._arena._child(view._index, position))
+
+
+def _view_type(node_type: type) -> type:
+    namespace = {'__slots__': ('_arena', '_index'), '__module__': node_type.__module__}
+    position = 0
+    for name, field_type in _FIELDS[node_type]:
+        namespace[name] = _field(position, field_type)
+        if field_type != _TOKEN:
+            position += 1
+    return type(node_type.__name__, (node_type,), namespace)
+
+
+# Views subclass each node type, so they pass the same isinstance checks as nodes built directly
+_VIEWS = {node_type: _view_type(node_type) for node_type in _FIELDS}
@@ -0,0 +1,80 @@
+from collections import deque
+from numbers import Integral
+from typing import Any, Callable, Optional, Tuple
+from vinyl.lex import *
+from ._node import *
+from ._parser import *
+from ._parser import _TokenListLexer
+
+__all__ = [
+    'AsyncParser'
+]
+
+
+class _Starved(Exception):
+    pass
+
+
+class AsyncParser(object):
+    @property
+    def names(self) -> InternTable:
+        return self._lexer.names
+
+    def __init__(self, reader: Any, lexer_type: Callable[..., BaseLexer]=None, chunk_size: Integral=65536, **options):
+        super().__init__()
+        options.setdefault('skip_comments', True)
+        self._lexer = AsyncLexer(reader, lexer_type, chunk_size, **options)
+        self._tokens = []
+        # Indices of buffered let/def keywords outside any braces, where a new declaration may start
+        self._boundaries = deque()
+        self._depth = 0
+        self._end = None
+
+    async def _pull(self):
+        try:
+            token = await self._lexer.__anext__()
+        except StopAsyncIteration:
+            self._end = StopIteration()
+            return
+        except SyntacticalError as e:
+            self._end = e
+            return
+        if isinstance(token, CommentToken):
+            return
+        if isinstance(token, SymbolToken):
+            if token.kind is SymbolTokenKind.BRACE_OPEN:
+                self._depth += 1
+            elif token.kind is SymbolTokenKind.BRACE_CLOSE:
+                self._depth -= 1
+        elif isinstance(token, KeywordToken) and self._depth <= 0:
+            if token.kind in (KeywordTokenKind.LET, KeywordTokenKind.DEF):
+                self._boundaries.append(len(self._tokens))
+        self._tokens.append(token)
+
+    def _parse_one(self) -> Tuple[Optional[BaseNode], Integral]:
+        end = self._end if self._end is not None else _Starved()
+        lexer = PeekLexer(_TokenListLexer(self._lexer.istream, self._tokens, end, self.names))
+        node = Parser(lexer)._consume_top_level()
+        return node, lexer.position
+
+    def __aiter__(self) -> 'AsyncParser':
+        return self
+
+    async def __anext__(self) -> BaseNode:
+        while True:
+            if self._end is None and not any(index > 0 for index in self._boundaries):
+                await self._pull()
+                continue
+            if not self._tokens and isinstance(self._end, StopIteration):
+                raise StopAsyncIteration
+            try:
+                node, consumed = self._parse_one()
+            except _Starved:
+                # The declaration runs past the next boundary, so wait for more tokens and parse it again
+                self._boundaries.clear()
+                await self._pull()
+                continue
+            del self._tokens[:consumed]
+            self._boundaries = deque(index - consumed for index in self._boundaries if index >= consumed)
+            if node is not None:
+                return node
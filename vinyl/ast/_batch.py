@@ -0,0 +1,256 @@
+import io
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from numbers import Integral
+from typing import Iterable, List, Optional, Tuple, Union
+from vinyl.lex import *
+from ._node import *
+from ._node import _iter_tokens
+from ._parser import *
+from ._serialize import *
+
+__all__ = [
+    'Diagnostic',
+    'ParseResult',
+    'parse_file',
+    'parse_files',
+    'split_points',
+    'parse_file_parallel'
+]
+
+
+class Diagnostic(object):
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def message(self) -> str:
+        return self._message
+
+    @property
+    def line(self) -> Integral:
+        return self._line
+
+    @property
+    def column(self) -> Integral:
+        return self._column
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def line_text(self) -> str:
+        return self._line_text
+
+    def __init__(self, path: str, message: str, line: Integral, column: Integral, text: str, line_text: str):
+        super().__init__()
+        self._path = path
+        self._message = message
+        self._line = line
+        self._column = column
+        self._text = text
+        self._line_text = line_text
+
+    @classmethod
+    def from_error(cls, path: str, error: SyntacticalError, istream: StreamBase) -> 'Diagnostic':
+        # Errors at the end of the input carry no token
+        start = error.token.start_location if error.token is not None else istream.location
+        line_text = istream.line_map.get(start.line, '')
+        text = error.token.text if error.token is not None else ''
+        return cls(path, error.message, start.line, start.column, text, line_text)
+
+    @classmethod
+    def from_read_error(cls, path: str, error: Union[OSError, UnicodeDecodeError]) -> 'Diagnostic':
+        message = error.strerror if isinstance(error, OSError) and error.strerror else str(error)
+        return cls(path, message, 0, 0, '', '')
+
+    def __str__(self) -> str:
+        if self._line == 0:
+            return '{}: Read Error => {}'.format(self._path, self._message)
+        return '{}:{}:{}: Syntax Error => {}\n{}\n{}{}'.format(
+            self._path, self._line, self._column, self._message,
+            self._line_text,
+            ' ' * max(self._column - 1, 0), '~' * max(len(self._text), 1))
+
+
+class ParseResult(object):
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def nodes(self) -> Optional[List[BaseNode]]:
+        return self._nodes
+
+    @property
+    def diagnostic(self) -> Optional[Diagnostic]:
+        return self._diagnostic
+
+    def __init__(self, path: str, nodes: Optional[List[BaseNode]], diagnostic: Optional[Diagnostic]):
+        super().__init__()
+        self._path = path
+        self._nodes = nodes
+        self._diagnostic = diagnostic
+
+
+def _dump_nodes(nodes: List[BaseNode]) -> bytes:
+    # Results cross process boundaries in the serialized AST format rather than as pickled nodes and locations
+    f = io.BytesIO()
+    with AstWriter(f) as writer:
+        for node in nodes:
+            writer.write(node)
+    return f.getvalue()
+
+
+def _load_nodes(payload: bytes, names: InternTable) -> List[BaseNode]:
+    with AstReader(payload, names) as reader:
+        return reader[:]
+
+
+def _buffer_lexer(buffer: TokenBuffer, istream: StreamBase, **options) -> BufferLexer:
+    return BufferLexer(buffer, **options)
+
+
+def parse_file(path: str, names: InternTable=None, cache: TokenCache=None, **options) -> ParseResult:
+    istream = None
+    try:
+        if cache is None:
+            istream = StringStream.from_file(path)
+            parser = Parser.from_stream(istream, names=names, **options)
+        else:
+            # Cached tokens are replayed the same whichever lexer would have produced them
+            lexer_type = options.pop('lexer_type', None)
+            try:
+                buffer = cache.tokenize_file(path)
+            except SyntacticalError:
+                # The whole file is lexed up front, so report the error an uncached parse would reach first
+                return parse_file(path, names, lexer_type=lexer_type, **options)
+            istream = buffer.istream
+            parser = Parser.from_stream(istream, partial(_buffer_lexer, buffer), names=names, **options)
+        return ParseResult(path, parser.parse(), None)
+    except SyntacticalError as e:
+        if istream is None:
+            istream = StringStream.from_file(path)
+        return ParseResult(path, None, Diagnostic.from_error(path, e, istream))
+    except (OSError, UnicodeDecodeError) as e:
+        return ParseResult(path, None, Diagnostic.from_read_error(path, e))
+
+
+def _parse_file_remote(args: Tuple[str, dict]) -> Tuple[str, Optional[bytes], Optional[Diagnostic]]:
+    path, options = args
+    result = parse_file(path, **options)
+    if result.nodes is None:
+        return path, None, result.diagnostic
+    try:
+        return path, _dump_nodes(result.nodes), None
+    except SyntacticalError as e:
+        # Lazily parsed bodies are forced by serialization
+        return path, None, Diagnostic.from_error(path, e, StringStream.from_file(path))
+
+
+def parse_files(paths: Iterable[str],
+                workers: Integral=None,
+                chunksize: Integral=1,
+                names: InternTable=None,
+                cache: TokenCache=None,
+                **options) -> List[ParseResult]:
+    names = names if names is not None else InternTable()
+    if workers == 1:
+        return [parse_file(path, names=names, cache=cache, **options) for path in paths]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        options['cache'] = cache
+        jobs = ((path, options) for path in paths)
+        for path, payload, diagnostic in executor.map(_parse_file_remote, jobs, chunksize=chunksize):
+            nodes = None
+            if payload is not None:
+                nodes = _load_nodes(payload, names)
+            results.append(ParseResult(path, nodes, diagnostic))
+    return results
+
+
+# Comments are skipped exactly as the lexer reads them, so a keyword is never split on inside one
+_SPLIT_SCANNER = re.compile(b'|'.join([
+    RegexLexer._COMMENT.encode('ascii'),
+    rb'(?P<brace>[{}])',
+    rb'(?<![\w\x80-\xff])(?P<keyword>def|let)(?![\w\x80-\xff])'
+]))
+
+
+def split_points(data: bytes, chunk_size: Integral) -> List[Integral]:
+    # Byte offsets of top-level def and let keywords outside comments, at least chunk_size bytes apart
+    points = [0]
+    depth = 0
+    for m in _SPLIT_SCANNER.finditer(data):
+        if m.group('brace') is not None:
+            depth += 1 if m.group('brace') == b'{' else -1
+        elif m.group('keyword') is not None and depth == 0 and m.start() - points[-1] >= chunk_size:
+            points.append(m.start())
+    return points
+
+
+def _parse_range(path: str, start: Integral, end: Integral, base: Tuple[Integral, Integral, Integral],
+                 names: InternTable=None, **options) -> List[BaseNode]:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        source = f.read(-1 if end is None else end - start).decode('utf-8')
+    lines, columns, offset = base
+    parser = Parser.from_stream(StringStream(source), names=names, **options)
+    try:
+        nodes = parser.parse()
+    except SyntacticalError as e:
+        if e.token is not None:
+            e.token.shift(lines, columns, offset)
+        raise
+    for node in nodes:
+        for token in _iter_tokens(node):
+            token.shift(lines, columns, offset)
+    return nodes
+
+
+def _parse_range_remote(args: Tuple) -> Optional[bytes]:
+    path, start, end, base, options = args
+    try:
+        return _dump_nodes(_parse_range(path, start, end, base, **options))
+    except Exception:
+        # The sequential parse is rerun from this chunk, so it decides which error is reported
+        return None
+
+
+def parse_file_parallel(path: str,
+                        workers: Integral=None,
+                        chunk_size: Integral=16 * 1024 * 1024,
+                        names: InternTable=None,
+                        **options) -> List[BaseNode]:
+    names = names if names is not None else InternTable()
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+    try:
+        points = split_points(data, chunk_size)
+        # Line, first-line column and character offset of each chunk's start within the whole file
+        bases = []
+        lines = characters = 0
+        for previous, point in zip([0] + points, points):
+            lines += data[previous:point].count(b'\n')
+            characters += len(data[previous:point].decode('utf-8'))
+            line_start = data.rfind(b'\n', 0, point) + 1
+            bases.append((lines, len(data[line_start:point].decode('utf-8')), characters))
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+    ends = points[1:] + [None]
+    nodes = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = ((path, start, end, base, options) for start, end, base in zip(points, ends, bases))
+        for index, payload in enumerate(executor.map(_parse_range_remote, jobs)):
+            if payload is None:
+                nodes.extend(_parse_range(path, points[index], None, bases[index], names=names, **options))
+                break
+            nodes.extend(_load_nodes(payload, names))
+    return nodes
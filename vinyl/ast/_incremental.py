@@ -0,0 +1,187 @@
+from array import array
+from numbers import Integral
+from typing import Callable, List, Sequence, Tuple, Union
+from vinyl.lex import *
+from ._node import *
+from ._node import _iter_tokens
+from ._parser import *
+
+__all__ = [
+    'SyntaxTree'
+]
+
+
+class SyntaxTree(Sequence[BaseNode]):
+    @property
+    def istream(self) -> StringStream:
+        return self._tokens.istream
+
+    @property
+    def tokens(self) -> TokenBuffer:
+        return self._tokens
+
+    @property
+    def names(self) -> InternTable:
+        return self._names
+
+    @property
+    def nodes(self) -> List[BaseNode]:
+        return [self[index] for index in range(len(self))]
+
+    @property
+    def spans(self) -> List[Tuple[Integral, Integral]]:
+        starts = [self._start(index) for index in range(len(self))]
+        return list(zip(starts, starts[1:] + [self.istream._length]))
+
+    def __init__(self,
+                 tokens: TokenBuffer,
+                 names: InternTable,
+                 nodes: List[BaseNode],
+                 starts: array,
+                 streams: List[StreamBase],
+                 deltas: array):
+        super().__init__()
+        self._tokens = tokens
+        self._names = names
+        # Each top-level node spans from its first token to the next node's first token. Tokens of reused nodes
+        # keep pointing at the stream they were lexed from, and are moved by their pending delta when accessed
+        self._nodes = nodes
+        self._starts = starts
+        self._streams = streams
+        self._deltas = deltas
+        # Starts and deltas from _split on are stored without _shift, so an edit only touches the nodes it
+        # replaces and the split only moves between edits, as the gap of a TokenBuffer does
+        self._split = len(nodes)
+        self._shift = 0
+
+    @classmethod
+    def parse(cls, source: str, names: InternTable=None) -> 'SyntaxTree':
+        names = names if names is not None else InternTable()
+        tokens = cls._tokenize(lambda: tokenize_all(StringStream(source)), lambda: source)
+        nodes, starts = cls._parse_region(BufferLexer(tokens, skip_comments=True, names=names))
+        return cls(tokens, names, nodes, starts, [tokens.istream] * len(nodes), array('q', [0] * len(nodes)))
+
+    @staticmethod
+    def _tokenize(tokenize: Callable[[], TokenBuffer], source: Callable[[], str]) -> TokenBuffer:
+        try:
+            return tokenize()
+        except SyntacticalError:
+            # The whole source is lexed up front, so a full parse decides which error comes first
+            Parser.from_stream(StringStream(source())).parse()
+            raise
+
+    @staticmethod
+    def _parse_region(source: BufferLexer) -> Tuple[List[BaseNode], array]:
+        lexer = PeekLexer(source)
+        parser = Parser(lexer)
+        nodes, starts = [], array('q')
+        while lexer.peek():
+            start = lexer.peek().start_location.offset
+            node = parser._consume_top_level()
+            if node is not None:
+                nodes.append(node)
+                starts.append(start)
+        return nodes, starts
+
+    @staticmethod
+    def _token_at(tokens: TokenBuffer, offset: Integral) -> Integral:
+        lo, hi = 0, len(tokens)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tokens.start(mid) < offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _start(self, index: Integral) -> Integral:
+        return self._starts[index] + self._shift if index >= self._split else self._starts[index]
+
+    def _node_at(self, offset: Integral, after: bool=False) -> Integral:
+        # The first node starting at or, if after is set, past offset
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._start(mid)
+            if start < offset or after and start == offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _move_split(self, index: Integral):
+        split, shift = self._split, self._shift
+        if shift and index < split:
+            for values in (self._starts, self._deltas):
+                values[index:split] = array('q', (value - shift for value in values[index:split]))
+        elif shift and index > split:
+            for values in (self._starts, self._deltas):
+                values[split:index] = array('q', (value + shift for value in values[split:index]))
+        self._split = index
+
+    def edit(self, start: Integral, end: Integral, text: str) -> 'SyntaxTree':
+        # The tree and its token buffer are updated in place and returned; both are left untouched on errors
+        istream = self.istream
+        removed = istream._slice(start, end)
+        tokens = self._tokenize(lambda: relex(self._tokens, start, end, text),
+                                lambda: istream._slice(0, start) + text + istream._slice(end, istream._length))
+        try:
+            return self._reparse(tokens, start, end, text)
+        except Exception:
+            relex(tokens, start, start + len(text), removed)
+            raise
+
+    def _reparse(self, tokens: TokenBuffer, start: Integral, end: Integral, text: str) -> 'SyntaxTree':
+        delta = len(text) - (end - start)
+        count = len(self._nodes)
+
+        # Reparse from the node before the first one touching the edit, since its parse depends on one token of
+        # lookahead
+        lo = max(self._node_at(start) - 2, 0)
+        hi = self._node_at(end, after=True)
+        region_start = self._start(lo) if lo > 0 else 0
+        first = self._token_at(tokens, region_start)
+        while True:
+            last = len(tokens)
+            if hi < count:
+                # The region must end where relexing resynchronized, on the first token of an unchanged node
+                last = self._token_at(tokens, self._start(hi) + delta)
+                if last == len(tokens) or tokens.start(last) != self._start(hi) + delta:
+                    hi += 1
+                    continue
+            source = BufferLexer(tokens[first:last], skip_comments=True, names=self._names)
+            try:
+                nodes, starts = self._parse_region(source)
+                break
+            except SyntacticalError:
+                # An error found before the end of the region is the one a full parse reports. Otherwise the last
+                # declaration may now run on into the next ones, so parse through to the end of the file once
+                if hi >= count or not source.exhausted:
+                    raise
+                hi = count
+
+        self._move_split(hi)
+        self._nodes[lo:hi] = nodes
+        self._streams[lo:hi] = [tokens.istream] * len(nodes)
+        self._starts[lo:hi] = starts
+        self._deltas[lo:hi] = array('q', bytes(8 * len(nodes)))
+        self._split = lo + len(nodes)
+        self._shift += delta
+        return self
+
+    def __len__(self) -> Integral:
+        return len(self._nodes)
+
+    def __getitem__(self, index: Union[Integral, slice]) -> Union[BaseNode, List[BaseNode]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        node = self._nodes[index]
+        if self._streams[index] is not self.istream:
+            shift = self._shift if index >= self._split else 0
+            for token in _iter_tokens(node):
+                token.relocate(self.istream, self._deltas[index] + shift)
+            self._streams[index] = self.istream
+            self._deltas[index] = -shift
+        return node
@@ -1,5 +1,6 @@
 from abc import ABC
-from typing import List, Optional
+from numbers import Integral
+from typing import Callable, Iterator, List, Optional, Union
 from vinyl.lex import *
 
 __all__ = [
@@ -9,6 +10,12 @@ __all__ = [
     'ArgumentNode',
     'StatementNode',
     'ExpressionNode',
+    'LiteralNode',
+    'ReferenceNode',
+    'UnaryOperationNode',
+    'BinaryOperationNode',
+    'CallNode',
+    'IndexNode',
     'IfStatementNode',
     'VariableDeclarationNode',
     'FunctionDefinitionNode'
@@ -16,23 +23,42 @@ __all__ = [
 
 
 class BaseNode(ABC):
-    pass
+    __slots__ = ()
 
 
 class IdentifierNode(BaseNode):
+    __slots__ = ('_identifier',)
+
     @property
     def identifier(self) -> IdentifierToken:
         return self._identifier
 
+    @property
+    def name_id(self) -> Optional[Integral]:
+        return self._identifier.name_id
+
     def __init__(self, identifier: IdentifierToken):
         self._identifier = identifier
 
+    def __eq__(self, other: 'IdentifierNode') -> bool:
+        if _base_type(type(self)) is not _base_type(type(other)):
+            return False
+        # Ids are only comparable within one table
+        if self.name_id is not None and self._identifier.names is other._identifier.names:
+            return self.name_id == other.name_id
+        return self._identifier.text == other._identifier.text
+
+    def __hash__(self) -> Integral:
+        return hash(self._identifier.text)
+
 
 class TypeNameNode(IdentifierNode):
-    pass
+    __slots__ = ()
 
 
 class ArgumentNode(BaseNode):
+    __slots__ = ('_identifier', '_type_name')
+
     @property
     def identifier(self) -> IdentifierNode:
         return self._identifier
@@ -47,17 +73,110 @@ class ArgumentNode(BaseNode):
 
 
 class StatementNode(BaseNode):
-    pass
+    __slots__ = ()
 
 
 class ExpressionNode(StatementNode):
-    pass
+    __slots__ = ()
+
+
+class LiteralNode(ExpressionNode):
+    __slots__ = ('_literal',)
+
+    @property
+    def literal(self) -> NumberTokenBase:
+        return self._literal
+
+    def __init__(self, literal: NumberTokenBase):
+        self._literal = literal
+
+
+class ReferenceNode(ExpressionNode):
+    __slots__ = ('_identifier',)
+
+    @property
+    def identifier(self) -> IdentifierNode:
+        return self._identifier
+
+    def __init__(self, identifier: IdentifierNode):
+        self._identifier = identifier
+
+
+class UnaryOperationNode(ExpressionNode):
+    __slots__ = ('_operator', '_operand')
+
+    @property
+    def operator(self) -> SymbolToken:
+        return self._operator
+
+    @property
+    def operand(self) -> ExpressionNode:
+        return self._operand
+
+    def __init__(self, operator: SymbolToken, operand: ExpressionNode):
+        self._operator = operator
+        self._operand = operand
+
+
+class BinaryOperationNode(ExpressionNode):
+    __slots__ = ('_operator', '_left', '_right')
+
+    @property
+    def operator(self) -> SymbolToken:
+        return self._operator
+
+    @property
+    def left(self) -> ExpressionNode:
+        return self._left
+
+    @property
+    def right(self) -> ExpressionNode:
+        return self._right
+
+    def __init__(self, operator: SymbolToken, left: ExpressionNode, right: ExpressionNode):
+        self._operator = operator
+        self._left = left
+        self._right = right
+
+
+class CallNode(ExpressionNode):
+    __slots__ = ('_callee', '_arguments')
+
+    @property
+    def callee(self) -> ExpressionNode:
+        return self._callee
+
+    @property
+    def arguments(self) -> List[ExpressionNode]:
+        return self._arguments
+
+    def __init__(self, callee: ExpressionNode, arguments: List[ExpressionNode]):
+        self._callee = callee
+        self._arguments = arguments
+
+
+class IndexNode(ExpressionNode):
+    __slots__ = ('_target', '_subscript')
+
+    @property
+    def target(self) -> ExpressionNode:
+        return self._target
+
+    @property
+    def subscript(self) -> ExpressionNode:
+        return self._subscript
+
+    def __init__(self, target: ExpressionNode, subscript: ExpressionNode):
+        self._target = target
+        self._subscript = subscript
 
 
 class IfStatementNode(StatementNode):
+    __slots__ = ('_expression', '_when_true', '_when_false')
+
     @property
     def expression(self) -> ExpressionNode:
-        return self.expression
+        return self._expression
 
     @property
     def when_true(self) -> List[StatementNode]:
@@ -74,6 +193,8 @@ class IfStatementNode(StatementNode):
 
 
 class VariableDeclarationNode(StatementNode):
+    __slots__ = ('_identifier', '_type_name', '_value')
+
     @property
     def identifier(self) -> IdentifierNode:
         return self._identifier
@@ -93,6 +214,8 @@ class VariableDeclarationNode(StatementNode):
 
 
 class FunctionDefinitionNode(BaseNode):
+    __slots__ = ('_identifier', '_arguments', '_return_type', '_block')
+
     @property
     def identifier(self) -> IdentifierNode:
         return self._identifier
@@ -107,14 +230,61 @@ class FunctionDefinitionNode(BaseNode):
 
     @property
     def block(self) -> List[StatementNode]:
+        # A lazily parsed body is stored as the function that parses it, until it is first needed
+        if callable(self._block):
+            self._block = self._block()
         return self._block
 
     def __init__(self,
                  identifier: IdentifierNode,
                  arguments: List[ArgumentNode],
                  return_type: Optional[TypeNameNode],
-                 block: List[StatementNode]):
+                 block: Union[List[StatementNode], Callable[[], List[StatementNode]]]):
         self._identifier = identifier
         self._arguments = arguments
         self._return_type = return_type
         self._block = block
+
+
+_NODE, _TOKEN, _LIST = range(3)
+
+# Fields of each node type, in constructor order
+_FIELDS = {
+    IdentifierNode: (('_identifier', _TOKEN),),
+    TypeNameNode: (('_identifier', _TOKEN),),
+    ArgumentNode: (('_identifier', _NODE), ('_type_name', _NODE)),
+    StatementNode: (),
+    ExpressionNode: (),
+    LiteralNode: (('_literal', _TOKEN),),
+    ReferenceNode: (('_identifier', _NODE),),
+    UnaryOperationNode: (('_operator', _TOKEN), ('_operand', _NODE)),
+    BinaryOperationNode: (('_operator', _TOKEN), ('_left', _NODE), ('_right', _NODE)),
+    CallNode: (('_callee', _NODE), ('_arguments', _LIST)),
+    IndexNode: (('_target', _NODE), ('_subscript', _NODE)),
+    IfStatementNode: (('_expression', _NODE), ('_when_true', _LIST), ('_when_false', _LIST)),
+    VariableDeclarationNode: (('_identifier', _NODE), ('_type_name', _NODE), ('_value', _NODE)),
+    FunctionDefinitionNode: (('_identifier', _NODE), ('_arguments', _LIST), ('_return_type', _NODE), ('_block', _LIST))
+}
+
+
+def _base_type(node_type: type) -> Optional[type]:
+    # Arena views and other subclasses of a node type stand for that type
+    while node_type is not None and node_type not in _FIELDS:
+        node_type = node_type.__base__
+    return node_type
+
+
+def _iter_tokens(node: BaseNode) -> Iterator[BaseToken]:
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        for name, field_type in _FIELDS[_base_type(type(node))]:
+            value = getattr(node, name[1:])
+            if value is None:
+                continue
+            if field_type == _TOKEN:
+                yield value
+            elif field_type == _NODE:
+                stack.append(value)
+            else:
+                stack.extend(item for item in value if item is not None)
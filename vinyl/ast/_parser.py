@@ -1,47 +1,131 @@
-from typing import List, cast
+from functools import partial
+from numbers import Integral
+from typing import Callable, Iterator, List, Optional, Tuple, Union, cast
 from vinyl.lex import *
 from ._node import *
+from ._arena import *
 
 __all__ = [
     'Parser'
 ]
 
 
+_PREFIX, _INFIX, _GROUP, _CALL, _SUBSCRIPT = range(5)
+
+
+class _TokenListLexer(BaseLexer):
+    def __init__(self, istream: StreamBase, tokens: List[BaseToken], end: BaseException, names: InternTable):
+        super().__init__(istream, names=names)
+        self._tokens = iter(tokens)
+        self._end = end
+
+    def __next__(self) -> BaseToken:
+        for token in self._tokens:
+            return token
+        raise self._end
+
+
+def _parse_block(tokens: List[BaseToken],
+                 end: BaseException,
+                 names: InternTable,
+                 block_type: str) -> List[StatementNode]:
+    return Parser(PeekLexer(_TokenListLexer(None, tokens, end, names)))._consume_block(block_type)
+
+
+def _relex_block(relex: Callable[[], Tuple[List[BaseToken], BaseException]],
+                 names: InternTable,
+                 block_type: str) -> List[StatementNode]:
+    tokens, end = relex()
+    return _parse_block(tokens, end, names, block_type)
+
+
 class Parser:
+    # Binding powers; infix operators bind (left, right), with the higher side making them associate that way
+    _PREFIX_POWER = {
+        SymbolTokenKind.PLUS: 15,
+        SymbolTokenKind.MINUS: 15,
+        SymbolTokenKind.EXCLAMATION_POINT: 15
+    }
+    _INFIX_POWERS = {
+        SymbolTokenKind.EQUAL: (2, 1),
+        SymbolTokenKind.LESS_THAN: (5, 6),
+        SymbolTokenKind.GREATER_THAN: (5, 6),
+        SymbolTokenKind.PLUS: (7, 8),
+        SymbolTokenKind.MINUS: (7, 8),
+        SymbolTokenKind.ASTERISK: (9, 10),
+        SymbolTokenKind.DOT: (19, 20),
+        SymbolTokenKind.SCOPE: (19, 20)
+    }
+    _POSTFIX_POWER = {
+        SymbolTokenKind.PAREN_OPEN: 17,
+        SymbolTokenKind.BRACKET_OPEN: 17
+    }
+
     @property
     def lexer(self) -> PeekLexer:
         return self._lexer
 
-    def __init__(self, lexer: PeekLexer):
+    @property
+    def names(self) -> InternTable:
+        return self._lexer.names
+
+    @property
+    def arena(self) -> Optional[NodeArena]:
+        return self._arena
+
+    @property
+    def lazy_bodies(self) -> bool:
+        return self._lazy_bodies
+
+    def __init__(self, lexer: PeekLexer, arena: NodeArena=None, lazy_bodies: bool=False):
+        if arena is not None and lazy_bodies:
+            raise ValueError('Function bodies cannot be parsed lazily into an arena')
         self._lexer = lexer
+        self._arena = arena
+        self._lazy_bodies = lazy_bodies
+        if arena is not None:
+            arena._attach(lexer.istream, lexer.names)
 
     @classmethod
-    def from_stream(cls, istream: StreamBase):
-        return cls(PeekLexer.from_stream(istream))
+    def from_stream(cls,
+                    istream: StreamBase,
+                    lexer_type: Callable[..., BaseLexer]=None,
+                    arena: NodeArena=None,
+                    lazy_bodies: bool=False,
+                    **options):
+        return cls(PeekLexer.from_stream(istream, lexer_type, **options), arena, lazy_bodies)
+
+    def _new(self, node_type: type, *fields) -> Union[BaseNode, Integral]:
+        if self._arena is None:
+            return node_type(*fields)
+        # Nodes built in an arena are passed around by index, and only the ones handed back get a view
+        fields = [self._arena.add_token(field) if isinstance(field, BaseToken) else field for field in fields]
+        return self._arena.add(node_type, *fields)
 
     def parse(self) -> List[BaseNode]:
-        nodes = []
-        try:
-            while True:
-                token = self._lexer.peek()
-                if not token:
-                    break
-                if self._is_keyword(token, KeywordTokenKind.LET):
-                    nodes.append(self._consume_variable_declaration())
-                elif self._is_keyword(token, KeywordTokenKind.DEF):
-                    nodes.append(self._consume_function_definition())
-                elif self._is_symbol(token, SymbolTokenKind.SEMI_COLON):
-                    self._lexer.read()
-                else:
-                    raise SyntacticalError(token, 'Unexpected {}: "{}"'.format(token.short_name(), token.text))
+        return list(self.iter_parse())
 
-        except SyntacticalError as e:
-            raise e
+    def iter_parse(self) -> Iterator[BaseNode]:
+        while self._lexer.peek():
+            node = self._consume_top_level()
+            if node is not None:
+                yield node if self._arena is None else self._arena.node(node)
 
-        return nodes
+    def _consume_top_level(self) -> Optional[BaseNode]:
+        token = self._lexer.peek()
+        if self._is_keyword(token, KeywordTokenKind.LET):
+            return self._consume_variable_declaration()
+        elif self._is_keyword(token, KeywordTokenKind.DEF):
+            return self._consume_function_definition()
+        elif self._is_symbol(token, SymbolTokenKind.SEMI_COLON):
+            self._lexer.read()
+            return None
+        else:
+            raise SyntacticalError(token, 'Unexpected {}: "{}"'.format(token.short_name(), token.text))
 
     def _consume_function_definition(self) -> FunctionDefinitionNode:
         self._consume_keyword(KeywordTokenKind.DEF, 'Function definitions must begin with "{}"')
+        token = self._lexer.peek()
         name = self._consume_identifier('The {}: "{}" is not a valid function name')
 
         self._consume_symbol(SymbolTokenKind.PAREN_OPEN, 'Expected "{}" to begin function argument list')
@@ -50,7 +134,7 @@ class Parser:
             while True:
                 identifier = self._consume_identifier('The {}: "{}" is not a valid argument name')
                 type_name = self._consume_type_name('The {} "{}" is not a valid argument type')
-                args.append(ArgumentNode(identifier, type_name))
+                args.append(self._new(ArgumentNode, identifier, type_name))
                 if not self._is_symbol(self._lexer.peek(), SymbolTokenKind.COMMA):
                     break
                 else:
@@ -61,9 +145,43 @@ class Parser:
         if not self._is_symbol(self._lexer.peek(), SymbolTokenKind.BRACE_OPEN):
             return_type = self._consume_type_name('Unexpected {}: "{}" as function return type')
 
-        block = self._consume_block('the function body of "{}"'.format(name.identifier.text))
+        block_type = 'the function body of "{}"'.format(token.text)
+        if self._lazy_bodies:
+            block = self._defer_block(block_type)
+        else:
+            block = self._consume_block(block_type)
+
+        return self._new(FunctionDefinitionNode, name, args, return_type, block)
 
-        return FunctionDefinitionNode(name, args, return_type, block)
+    def _defer_block(self, block_type: str) -> Union[List[StatementNode], Callable[[], List[StatementNode]]]:
+        if not self._is_symbol(self._lexer.peek(), SymbolTokenKind.BRACE_OPEN):
+            return self._consume_block(block_type)
+        # Lexers that can scan for the matching brace keep only where the body is; the others keep its tokens
+        relex = self._lexer._skip_block()
+        if relex is not None:
+            return partial(_relex_block, relex, self.names, block_type)
+        tokens = []
+        end = StopIteration()
+        depth = 0
+        try:
+            while True:
+                token = self._lexer.peek()
+                if token is None:
+                    break
+                tokens.append(self._lexer.read())
+                if self._is_symbol(token, SymbolTokenKind.BRACE_OPEN):
+                    depth += 1
+                elif self._is_symbol(token, SymbolTokenKind.BRACE_CLOSE):
+                    depth -= 1
+                    if depth == 0:
+                        break
+        except SyntacticalError as e:
+            end = e
+        parse = partial(_parse_block, tokens, end, self.names, block_type)
+        if depth != 0:
+            # Without a matching brace the end of the function is unknown, so report the error as an eager parse would
+            return parse()
+        return parse
 
     def _consume_block(self, block_type: str) -> List[StatementNode]:
         self._consume_symbol(SymbolTokenKind.BRACE_OPEN, 'Expected "{{}}" to begin {}'.format(block_type))
@@ -87,14 +205,14 @@ class Parser:
         return statement
 
     def _consume_if_statement(self) -> IfStatementNode:
-        self._consume_keyword(KeywordTokenKind.IF, 'If statements must begin with "{}"')
-        expression = self._consume_expression()
+        keyword = self._consume_keyword(KeywordTokenKind.IF, 'If statements must begin with "{}"')
+        expression = self._consume_expression(keyword)
         when_true = self._consume_block('true-condition of if statement')
         when_false = []
         if self._is_keyword(self._lexer.peek(), KeywordTokenKind.ELSE):
             self._lexer.read()
             when_false = self._consume_block('false-condition of if statement')
-        return IfStatementNode(expression, when_true, when_false)
+        return self._new(IfStatementNode, expression, when_true, when_false)
 
     def _consume_variable_declaration(self) -> VariableDeclarationNode:
         self._consume_keyword(KeywordTokenKind.LET, 'Variable declarations must begin with "{}"')
@@ -102,25 +220,97 @@ class Parser:
         type_name = self._consume_type_name('The {} "{}" is not a valid variable type')
         value = None
         if self._is_symbol(self._lexer.peek(), SymbolTokenKind.EQUAL):
-            self._lexer.read()
-            value = self._consume_expression()
-        return VariableDeclarationNode(identifier, type_name, value)
+            value = self._consume_expression(self._lexer.read())
+        return self._new(VariableDeclarationNode, identifier, type_name, value)
+
+    def _consume_expression(self, previous: BaseToken) -> ExpressionNode:
+        # Pratt parsing over an explicit stack: entries are pending operators or open brackets awaiting their operand
+        stack = []
+        while True:
+            token = self._lexer.peek()
+            while self._is_prefix_operator(token):
+                stack.append((_PREFIX, self._lexer.read(), self._PREFIX_POWER[token.kind]))
+                previous, token = token, self._lexer.peek()
+            if self._is_symbol(token, SymbolTokenKind.PAREN_OPEN):
+                stack.append((_GROUP, self._lexer.read(), None))
+                previous = token
+                continue
+            if isinstance(token, NumberTokenBase):
+                value = self._new(LiteralNode, self._lexer.read())
+            elif self._is_identifier(token):
+                value = self._new(ReferenceNode, self._consume_identifier('The {}: "{}" is not a valid name'))
+            elif token is None:
+                raise SyntacticalError(previous, 'Expected an expression after "{}"'.format(previous.text))
+            else:
+                raise SyntacticalError(token, 'Expected an expression, found {}: "{}"'.format(
+                    token.short_name(), token.text))
 
-    def _consume_expression(self) -> ExpressionNode:
-        self._lexer.read()
-        pass
+            while True:
+                token = self._lexer.peek()
+                kind = token.kind if isinstance(token, SymbolToken) else None
+                power = self._INFIX_POWERS.get(kind, (self._POSTFIX_POWER.get(kind, 0), None))[0]
+                while stack and stack[-1][0] in (_PREFIX, _INFIX) and stack[-1][2] >= power:
+                    entry, operator, _, *left = stack.pop()
+                    if entry == _PREFIX:
+                        value = self._new(UnaryOperationNode, operator, value)
+                    else:
+                        value = self._new(BinaryOperationNode, operator, left[0], value)
+                if kind in self._INFIX_POWERS:
+                    stack.append((_INFIX, self._lexer.read(), self._INFIX_POWERS[kind][1], value))
+                elif kind is SymbolTokenKind.PAREN_OPEN:
+                    self._lexer.read()
+                    if self._is_symbol(self._lexer.peek(), SymbolTokenKind.PAREN_CLOSE):
+                        self._lexer.read()
+                        value = self._new(CallNode, value, [])
+                        continue
+                    stack.append((_CALL, token, None, value, []))
+                elif kind is SymbolTokenKind.BRACKET_OPEN:
+                    stack.append((_SUBSCRIPT, self._lexer.read(), None, value))
+                elif not stack:
+                    return value
+                elif stack[-1][0] == _CALL and kind is SymbolTokenKind.COMMA:
+                    stack[-1][4].append(value)
+                    self._lexer.read()
+                elif stack[-1][0] == _CALL and kind is SymbolTokenKind.PAREN_CLOSE:
+                    _, _, _, callee, arguments = stack.pop()
+                    arguments.append(value)
+                    self._lexer.read()
+                    value = self._new(CallNode, callee, arguments)
+                    continue
+                elif stack[-1][0] == _GROUP and kind is SymbolTokenKind.PAREN_CLOSE:
+                    stack.pop()
+                    self._lexer.read()
+                    continue
+                elif stack[-1][0] == _SUBSCRIPT and kind is SymbolTokenKind.BRACKET_CLOSE:
+                    _, _, _, target = stack.pop()
+                    self._lexer.read()
+                    value = self._new(IndexNode, target, value)
+                    continue
+                else:
+                    closer = ']' if stack[-1][0] == _SUBSCRIPT else ')'
+                    if token is None:
+                        raise SyntacticalError(stack[-1][1], 'Expected "{}" to close "{}"'.format(
+                            closer, stack[-1][1].text))
+                    raise SyntacticalError(token, 'Expected "{}" to close "{}", found {}: "{}"'.format(
+                        closer, stack[-1][1].text, token.short_name(), token.text))
+                previous = token
+                break
 
     def _consume_type_name(self, error_message: str) -> TypeNameNode:
         token = self._lexer.peek()
+        if token is None:
+            raise SyntacticalError(None, 'Unexpected end of input')
         if not self._is_identifier(token):
             raise SyntacticalError(token, error_message.format(token.short_name(), token.text))
-        return TypeNameNode(cast(IdentifierToken, self._lexer.read()))
+        return self._new(TypeNameNode, cast(IdentifierToken, self._lexer.read()))
 
     def _consume_identifier(self, error_message: str) -> IdentifierNode:
         token = self._lexer.peek()
+        if token is None:
+            raise SyntacticalError(None, 'Unexpected end of input')
         if not self._is_identifier(token):
             raise SyntacticalError(token, error_message.format(token.short_name(), token.text))
-        return IdentifierNode(cast(IdentifierToken, self._lexer.read()))
+        return self._new(IdentifierNode, cast(IdentifierToken, self._lexer.read()))
 
     def _consume_symbol(self, kind: SymbolTokenKind, error_message: str) -> SymbolToken:
         token = self._lexer.peek()
@@ -134,6 +324,10 @@ class Parser:
             raise SyntacticalError(token, error_message.format(kind.value))
         return self._lexer.read()
 
+    @classmethod
+    def _is_prefix_operator(cls, token: BaseToken) -> bool:
+        return isinstance(token, SymbolToken) and cast(SymbolToken, token).kind in cls._PREFIX_POWER
+
     @staticmethod
     def _is_identifier(token: BaseToken) -> bool:
         return isinstance(token, IdentifierToken)
@@ -0,0 +1,298 @@
+import mmap
+import struct
+import sys
+from array import array
+from numbers import Integral
+from typing import BinaryIO, List, Optional, Sequence, Tuple, Union
+from vinyl.lex import *
+from ._node import *
+from ._node import _FIELDS, _NODE, _TOKEN, _base_type
+
+__all__ = [
+    'AstWriter',
+    'AstReader'
+]
+
+_TOKENS = (CommentToken, WhitespaceToken, IdentifierToken, IntegerToken, FloatToken, KeywordToken, SymbolToken)
+_TYPES = {t.__name__: t for t in list(_FIELDS) + list(_TOKENS)}
+
+_MAGIC = b'VAST'
+_VERSION = 2
+# magic, version and byte order
+_HEADER = struct.Struct('=4sHBx')
+# Each root is written as a block that starts with the counts of new kinds, nodes, fields, tokens and new strings and
+# the size of the new strings. Kinds and strings are numbered across the file, and each block adds those it first uses
+_BLOCK = struct.Struct('=6Q')
+# The offsets of the blocks come last, followed by the root, kind and string counts and the magic again
+_TRAILER = struct.Struct('=3Q4s4x')
+_BYTEORDER = {'little': 0, 'big': 1}[sys.byteorder]
+
+
+class AstWriter(object):
+    def __init__(self, fileobj: BinaryIO):
+        super().__init__()
+        self._fileobj = fileobj
+        self._kind_ids = {}
+        self._string_ids = {}
+        self._blocks = array('q')
+        self._offset = _HEADER.size
+        self._fileobj.write(_HEADER.pack(_MAGIC, _VERSION, _BYTEORDER))
+        self._start_block()
+
+    def _start_block(self):
+        self._kinds = array('q')
+        self._node_kinds = array('H')
+        self._node_fields = array('q')
+        self._fields = array('q')
+        self._token_kinds = array('H')
+        self._token_texts = array('q')
+        self._token_positions = array('q')
+        self._string_ends = array('q')
+        self._strings = []
+
+    def _string(self, s: str) -> Integral:
+        string_id = self._string_ids.get(s)
+        if string_id is None:
+            string_id = self._string_ids[s] = len(self._string_ids)
+            encoded = s.encode('utf-8')
+            self._strings.append(encoded)
+            self._string_ends.append((self._string_ends[-1] if self._string_ends else 0) + len(encoded))
+        return string_id
+
+    def _kind(self, t: type) -> Integral:
+        kind = self._kind_ids.get(t)
+        if kind is None:
+            if t not in _FIELDS and t not in _TOKENS:
+                raise TypeError('Cannot serialize {}'.format(t.__name__))
+            kind = self._kind_ids[t] = len(self._kind_ids)
+            self._kinds.append(self._string(t.__name__))
+        return kind
+
+    def _token(self, token: BaseToken) -> Integral:
+        index = len(self._token_kinds)
+        self._token_kinds.append(self._kind(type(token)))
+        self._token_texts.append(self._string(token.text))
+        for location in (token.start_location, token.end_location):
+            self._token_positions.extend((location.line, location.column, location.offset))
+        return index
+
+    def _node(self, node: BaseNode, pending: List[Tuple[Integral, BaseNode]]) -> Integral:
+        index = len(self._node_kinds)
+        node_type = _base_type(type(node)) or type(node)
+        self._node_kinds.append(self._kind(node_type))
+        start = len(self._fields)
+        self._node_fields.append(start)
+        fields = _FIELDS[node_type]
+        self._fields.extend([-1] * len(fields))
+        for i, (name, field_type) in enumerate(fields):
+            value = getattr(node, name[1:])
+            if value is None:
+                continue
+            if field_type == _TOKEN:
+                self._fields[start + i] = self._token(value)
+            elif field_type == _NODE:
+                pending.append((start + i, value))
+            else:
+                self._fields[start + i] = len(self._fields)
+                self._fields.append(len(value))
+                for item in value:
+                    if item is not None:
+                        pending.append((len(self._fields), item))
+                    self._fields.append(-1)
+        return index
+
+    def write(self, node: BaseNode):
+        # Children are written from an explicit work list so deeply nested trees do not recurse. The root is the
+        # first node of its block
+        pending = []
+        self._node(node, pending)
+        while pending:
+            field, child = pending.pop()
+            self._fields[field] = self._node(child, pending)
+
+        pool = self._string_ends[-1] if self._string_ends else 0
+        chunks = [_BLOCK.pack(len(self._kinds), len(self._node_kinds), len(self._fields), len(self._token_kinds),
+                              len(self._strings), pool)]
+        # 8-byte arrays come first and blocks are padded, so every section stays aligned
+        for values in (self._kinds, self._node_fields, self._fields, self._token_texts, self._token_positions,
+                       self._string_ends, self._node_kinds, self._token_kinds):
+            chunks.append(values.tobytes())
+        chunks.extend(self._strings)
+        size = sum(len(chunk) for chunk in chunks)
+        chunks.append(bytes(-size % 8))
+        self._fileobj.write(b''.join(chunks))
+        self._blocks.append(self._offset)
+        self._offset += size + -size % 8
+        self._start_block()
+
+    def close(self):
+        self._fileobj.write(self._blocks.tobytes())
+        self._fileobj.write(_TRAILER.pack(len(self._blocks), len(self._kind_ids), len(self._string_ids), _MAGIC))
+        self._fileobj.flush()
+
+    def __enter__(self) -> 'AstWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class AstReader(Sequence[BaseNode]):
+    _SECTIONS = ('q', 'q', 'q', 'q', 'q', 'q', 'H', 'H')
+
+    @property
+    def names(self) -> Optional[InternTable]:
+        return self._names
+
+    def __init__(self, data: Union[bytes, mmap.mmap], names: InternTable=None):
+        super().__init__()
+        self._data = data
+        self._names = names
+        if len(data) < _HEADER.size + _TRAILER.size:
+            raise ValueError('Truncated AST header')
+        magic, version, byteorder = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError('Not a serialized AST')
+        if version != _VERSION:
+            raise ValueError('Unsupported AST format version {}'.format(version))
+        if byteorder != _BYTEORDER:
+            raise ValueError('AST was written with a different byte order')
+        roots, kinds, strings, magic = _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+        self._end = len(data) - _TRAILER.size - roots * 8
+        if magic != _MAGIC or self._end < _HEADER.size:
+            raise ValueError('Truncated AST data')
+        self._blocks = array('q')
+        self._blocks.frombytes(data[self._end:self._end + roots * 8])
+
+        # Only the kinds and strings each block adds are read up front; nodes are read when their root is
+        self._string_starts = array('q')
+        self._string_ends = array('q')
+        kind_names = array('q')
+        for offset in self._blocks:
+            sections, pool, _ = self._layout(offset)
+            kind_names.frombytes(data[sections[0][0]:sections[0][1]])
+            ends = array('q')
+            ends.frombytes(data[sections[5][0]:sections[5][1]])
+            start = pool
+            for end in ends:
+                self._string_starts.append(start)
+                self._string_ends.append(pool + end)
+                start = pool + end
+        if len(kind_names) != kinds or len(self._string_starts) != strings:
+            raise ValueError('Truncated AST data')
+        self._strings = {}
+        self._types = []
+        for string_id in kind_names:
+            name = self._string(string_id)
+            if name not in _TYPES:
+                raise ValueError('Unknown AST kind "{}"'.format(name))
+            self._types.append(_TYPES[name])
+        self._cache = {}
+
+    def _layout(self, offset: Integral) -> Tuple[List[Tuple[Integral, Integral]], Integral, Integral]:
+        # The byte ranges of a block's sections, and where its strings start and end
+        if offset < _HEADER.size or offset + _BLOCK.size > self._end:
+            raise ValueError('Truncated AST data')
+        kinds, nodes, fields, tokens, strings, pool = _BLOCK.unpack_from(self._data, offset)
+        offset += _BLOCK.size
+        sections = []
+        for count, code in zip((kinds, nodes, fields, tokens, tokens * 6, strings, nodes, tokens), self._SECTIONS):
+            end = offset + count * array(code).itemsize
+            sections.append((offset, end))
+            offset = end
+        if offset + pool > self._end:
+            raise ValueError('Truncated AST data')
+        return sections, offset, offset + pool
+
+    @classmethod
+    def from_file(cls, path: str, names: InternTable=None) -> 'AstReader':
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), names)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self) -> 'AstReader':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _string(self, string_id: Integral) -> str:
+        s = self._strings.get(string_id)
+        if s is None:
+            start, end = self._string_starts[string_id], self._string_ends[string_id]
+            s = self._strings[string_id] = self._data[start:end].decode('utf-8')
+        return s
+
+    def _token(self, index: Integral, token_kinds: array, token_texts: array, token_positions: array) -> BaseToken:
+        token_type = self._types[token_kinds[index]]
+        text = self._string(token_texts[index])
+        p = token_positions[index * 6:index * 6 + 6]
+        start_location, end_location = Location(p[0], p[1], p[2]), Location(p[3], p[4], p[5])
+        if issubclass(token_type, NumberTokenBase):
+            return token_type(text, start_location, end_location, True)
+        token = token_type(text, start_location, end_location)
+        if token_type is IdentifierToken and self._names is not None:
+            token.intern(self._names)
+        return token
+
+    def _node(self, root: Integral) -> BaseNode:
+        sections = []
+        for (start, end), code in zip(self._layout(self._blocks[root])[0], self._SECTIONS):
+            values = array(code)
+            values.frombytes(self._data[start:end])
+            sections.append(values)
+        _, node_fields, all_fields, token_texts, token_positions, _, node_kinds, token_kinds = sections
+
+        # Post-order over an explicit stack, so deeply nested trees do not recurse
+        built = {}
+        stack = [(0, False)]
+        while stack:
+            node, ready = stack.pop()
+            node_type = self._types[node_kinds[node]]
+            start = node_fields[node]
+            fields = _FIELDS[node_type]
+            if not ready:
+                stack.append((node, True))
+                for i, (_, field_type) in enumerate(fields):
+                    value = all_fields[start + i]
+                    if value == -1 or field_type == _TOKEN:
+                        continue
+                    if field_type == _NODE:
+                        stack.append((value, False))
+                    else:
+                        stack.extend((child, False) for child in all_fields[value + 1:value + 1 + all_fields[value]]
+                                     if child != -1)
+                continue
+            args = []
+            for i, (_, field_type) in enumerate(fields):
+                value = all_fields[start + i]
+                if value == -1:
+                    args.append(None)
+                elif field_type == _TOKEN:
+                    args.append(self._token(value, token_kinds, token_texts, token_positions))
+                elif field_type == _NODE:
+                    args.append(built.pop(value))
+                else:
+                    args.append([built.pop(child) if child != -1 else None
+                                 for child in all_fields[value + 1:value + 1 + all_fields[value]]])
+            built[node] = node_type(*args)
+        return built[0]
+
+    def __len__(self) -> Integral:
+        return len(self._blocks)
+
+    def __getitem__(self, index: Union[Integral, slice]) -> Union[BaseNode, List[BaseNode]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('AST index out of range')
+        node = self._cache.get(index)
+        if node is None:
+            node = self._cache[index] = self._node(index)
+        return node
@@ -1,3 +1,7 @@
 from ._stream import *
+from ._intern import *
 from ._token import *
 from ._lexer import *
+from ._buffer import *
+from ._cache import *
+from ._async import *
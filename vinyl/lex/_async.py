@@ -0,0 +1,85 @@
+import asyncio
+from numbers import Integral
+from typing import Any, Callable, Optional
+from ._intern import InternTable
+from ._token import *
+from ._stream import ChunkStream
+from ._lexer import BaseLexer, Lexer, SymbolLexer
+
+__all__ = [
+    'AsyncLexer'
+]
+
+
+class AsyncLexer(object):
+    # A token is final once this many characters follow it, enough for any lexer's lookahead
+    _MARGIN = len(SymbolLexer._LONGEST_SYMBOL.value)
+
+    @property
+    def istream(self) -> ChunkStream:
+        return self._istream
+
+    @property
+    def names(self) -> InternTable:
+        return self._lexer.names
+
+    def __init__(self,
+                 reader: Any,
+                 lexer_type: Callable[..., BaseLexer]=None,
+                 chunk_size: Integral=65536,
+                 yield_interval: Integral=1024,
+                 **options):
+        super().__init__()
+        self._reader = reader
+        self._chunk_size = chunk_size
+        self._yield_interval = yield_interval
+        self._count = 0
+        self._istream = ChunkStream(chunk_size)
+        self._lexer = (lexer_type or Lexer)(self._istream, **options)
+
+    async def _read_more(self, scanned: Integral):
+        # Wait until at least as much has arrived as the failed scan covered, so a token spanning many chunks is
+        # rescanned a logarithmic number of times rather than once per chunk
+        chunks = []
+        size = 0
+        while size < max(scanned, 1):
+            data = await self._reader.read(self._chunk_size)
+            if not data:
+                break
+            chunks.append(data)
+            size += len(data)
+        if chunks:
+            self._istream.feed(chunks[0][:0].join(chunks))
+        if size < max(scanned, 1):
+            self._istream.feed_eof()
+
+    def _complete(self, token: Optional[BaseToken]) -> bool:
+        if self._istream.finished:
+            return True
+        return token is not None and token.end_location.offset + self._MARGIN <= self._istream.available
+
+    def __aiter__(self) -> 'AsyncLexer':
+        return self
+
+    async def __anext__(self) -> BaseToken:
+        self._count += 1
+        if self._count % self._yield_interval == 0:
+            await asyncio.sleep(0)
+        while True:
+            checkpoint = self._istream.checkpoint()
+            try:
+                token = next(self._lexer)
+            except StopIteration:
+                if self._istream.finished:
+                    raise StopAsyncIteration
+                token = None
+            except SyntacticalError as e:
+                if self._complete(e.token):
+                    raise
+                token = None
+            if token is not None and self._complete(token):
+                self._istream.commit()
+                return token
+            # The token may continue in data that has not arrived yet, so scan it again once it has
+            self._istream.rollback(checkpoint)
+            await self._read_more(self._istream.available - checkpoint[0])
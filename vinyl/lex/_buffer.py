@@ -0,0 +1,364 @@
+from array import array
+from enum import Enum
+from numbers import Integral
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+from ._stream import Location, StreamBase, StringStream
+from ._token import *
+from ._intern import InternTable
+from ._lexer import BaseLexer, NumberLexer, RegexLexer, SymbolLexer
+
+__all__ = [
+    'TokenBuffer',
+    'BufferLexer',
+    'tokenize_all',
+    'relex'
+]
+
+
+class TokenBuffer(Sequence[BaseToken]):
+    _TYPES = [(CommentToken, None), (IdentifierToken, None), (IntegerToken, None), (FloatToken, None)] + \
+             [(KeywordToken, kind) for kind in KeywordTokenKind] + \
+             [(SymbolToken, kind) for kind in SymbolTokenKind]
+    _CODES = {entry: code for code, entry in enumerate(_TYPES)}
+
+    @property
+    def istream(self) -> StreamBase:
+        return self._istream
+
+    def __init__(self, istream: StreamBase):
+        super().__init__()
+        self._istream = istream
+        self._codes = array('B')
+        self._starts = array('q')
+        self._ends = array('q')
+        self._values = array('l')
+        self._texts = []
+        self._text_ids = {}
+        # A gap of _gap_size free slots follows the first _gap tokens. Offsets of the tokens after it are stored
+        # without _shift, so an edit only touches the tokens it replaces and the gap only moves between edits
+        self._gap = None
+        self._gap_size = 0
+        self._shift = 0
+        self._length = 0
+
+    def append(self, token_type: type(BaseToken), kind: Optional[Enum], text: str, start: Integral, end: Integral):
+        self._codes.append(self._CODES[token_type, kind])
+        self._starts.append(start - self._shift)
+        self._ends.append(end - self._shift)
+        if kind is None:
+            value = self._text_ids.get(text)
+            if value is None:
+                value = self._text_ids[text] = len(self._texts)
+                self._texts.append(text)
+        else:
+            value = -1
+        self._values.append(value)
+
+    def _index(self, index: Integral) -> Integral:
+        count = len(self._codes) - self._gap_size
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('TokenBuffer index out of range')
+        if self._gap is not None and index >= self._gap:
+            return index + self._gap_size
+        return index
+
+    def token_type(self, index: Integral) -> type(BaseToken):
+        return self._TYPES[self._codes[self._index(index)]][0]
+
+    def kind(self, index: Integral) -> Optional[Enum]:
+        return self._TYPES[self._codes[self._index(index)]][1]
+
+    def text(self, index: Integral) -> str:
+        index = self._index(index)
+        value = self._values[index]
+        if value == -1:
+            return self._TYPES[self._codes[index]][1].value
+        return self._texts[value]
+
+    def start(self, index: Integral) -> Integral:
+        return self._offset(self._starts, self._index(index))
+
+    def end(self, index: Integral) -> Integral:
+        return self._offset(self._ends, self._index(index))
+
+    def _offset(self, offsets: array, index: Integral) -> Integral:
+        if self._gap is not None and index >= self._gap:
+            return offsets[index] + self._shift
+        return offsets[index]
+
+    def _columns(self) -> Iterator[Tuple[array, bool]]:
+        return iter(((self._codes, False), (self._starts, True), (self._ends, True), (self._values, False)))
+
+    def _section(self, values: array, lo: Integral, hi: Integral, shifted: bool=False) -> array:
+        if self._gap is None:
+            return values[lo:hi]
+        gap, size = self._gap, self._gap_size
+        result = values[lo:min(hi, gap)]
+        if hi > gap:
+            after = values[max(lo, gap) + size:hi + size]
+            if shifted and self._shift:
+                after = array(values.typecode, (value + self._shift for value in after))
+            result += after
+        return result
+
+    def _move_gap(self, index: Integral):
+        count = len(self)
+        if self._gap is None:
+            if index >= count:
+                return
+            self._gap, self._gap_size, self._shift = count, 0, 0
+        gap, size, shift = self._gap, self._gap_size, self._shift
+        for values, shifted in self._columns():
+            if not size and not (shifted and shift):
+                continue
+            if index < gap:
+                block = values[index:gap]
+                if shifted and shift:
+                    block = array(values.typecode, (value - shift for value in block))
+                values[index + size:gap + size] = block
+            elif index > gap:
+                block = values[gap + size:index + size]
+                if shifted and shift:
+                    block = array(values.typecode, (value + shift for value in block))
+                values[gap:index] = block
+        self._gap = index
+        if index >= count:
+            for values, _ in self._columns():
+                del values[index:]
+            self._gap, self._gap_size, self._shift = None, 0, 0
+
+    def _splice(self, first: Integral, last: Integral, tokens: 'TokenBuffer', delta: Integral):
+        # Replaces tokens [first, last) with those of a gapless buffer and moves every later token by delta
+        self._move_gap(first)
+        if self._gap is None:
+            self._gap, self._gap_size, self._shift = len(self), 0, 0
+        self._gap_size += last - first
+        count = len(tokens)
+        if self._gap_size < count:
+            extra = max(count - self._gap_size, len(self._codes))
+            for values, _ in self._columns():
+                values[self._gap:self._gap] = array(values.typecode, bytes(values.itemsize * extra))
+            self._gap_size += extra
+        gap = self._gap
+        for (values, _), (other, _) in zip(self._columns(), tokens._columns()):
+            values[gap:gap + count] = other
+        self._gap += count
+        self._gap_size -= count
+        self._shift += delta
+        self._length += delta
+        if self._gap >= len(self):
+            self._move_gap(self._gap)
+
+    def location(self, offset: Integral) -> Location:
+        return Location._deferred(self._istream, offset)
+
+    def __len__(self) -> Integral:
+        return len(self._codes) - self._gap_size
+
+    def __getitem__(self, index: Union[Integral, slice]) -> Union[BaseToken, 'TokenBuffer']:
+        if isinstance(index, slice):
+            buffer = TokenBuffer(self._istream)
+            buffer._texts = self._texts
+            buffer._text_ids = self._text_ids
+            buffer._length = self._length
+            lo, hi, step = index.indices(len(self))
+            if step == 1:
+                for (values, shifted), (other, _) in zip(self._columns(), buffer._columns()):
+                    other += self._section(values, lo, max(lo, hi), shifted)
+            else:
+                for i in range(lo, hi, step):
+                    buffer.append(self.token_type(i), self.kind(i), self.text(i), self.start(i), self.end(i))
+            return buffer
+        index = self._index(index)
+        token_type, kind = self._TYPES[self._codes[index]]
+        value = self._values[index]
+        text = kind.value if value == -1 else self._texts[value]
+        start_location = self.location(self._offset(self._starts, index))
+        end_location = self.location(self._offset(self._ends, index))
+        if issubclass(token_type, NumberTokenBase):
+            # Literals were validated while scanning
+            return token_type(text, start_location, end_location, True)
+        return token_type(text, start_location, end_location)
+
+    def __iter__(self) -> Iterator[BaseToken]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class BufferLexer(BaseLexer):
+    @property
+    def exhausted(self) -> bool:
+        return self._index >= len(self._buffer)
+
+    def __init__(self,
+                 buffer: TokenBuffer,
+                 lazy_literals: bool=False,
+                 skip_comments: bool=False,
+                 trivia: bool=False,
+                 names: InternTable=None):
+        if trivia:
+            raise ValueError('Token buffers do not keep whitespace, so trivia cannot be replayed')
+        super().__init__(buffer.istream, lazy_literals=lazy_literals, skip_comments=skip_comments, names=names)
+        self._buffer = buffer
+        self._index = 0
+
+    def _skip_block(self, start: Integral) -> Optional[Integral]:
+        # The opening brace was the last token read, and the braces after it are matched by kind alone
+        depth = 1
+        for index in range(self._index, len(self._buffer)):
+            kind = self._buffer.kind(index)
+            if kind is SymbolTokenKind.BRACE_OPEN:
+                depth += 1
+            elif kind is SymbolTokenKind.BRACE_CLOSE:
+                depth -= 1
+                if depth == 0:
+                    self._index = index + 1
+                    return self._buffer.end(index)
+        return None
+
+    def _relex_block(self, start: Integral, end: Integral) -> Tuple[List[BaseToken], BaseException]:
+        index = self._index
+        lo, hi = 0, len(self._buffer)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._buffer.start(mid) < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        self._index = lo
+        tokens = []
+        try:
+            while self._index < len(self._buffer) and self._buffer.start(self._index) < end:
+                tokens.append(next(self))
+        finally:
+            self._index = index
+        return tokens, StopIteration()
+
+    def __next__(self) -> BaseToken:
+        while self._index < len(self._buffer):
+            index = self._index
+            self._index += 1
+            token_type = self._buffer.token_type(index)
+            if token_type is CommentToken and self._skip_comments:
+                continue
+            token = self._buffer[index]
+            if token_type is IdentifierToken:
+                token.intern(self.names)
+            elif not self._lazy_literals and issubclass(token_type, NumberTokenBase):
+                token._decode()
+            return token
+        raise StopIteration
+
+
+# Symbols are matched longest first, so a token is only certain once this many characters past its start are known
+_LOOKAHEAD = len(SymbolLexer._LONGEST_SYMBOL.value)
+
+
+def _append_next(buffer: TokenBuffer, lexer: RegexLexer, base: Integral=0) -> bool:
+    # The lexer may read a window of the buffer's stream that starts at offset base
+    istream = lexer._istream
+    try:
+        lexer.skip_spaces()
+    except StopIteration:
+        return False
+    start = base + istream.offset
+    kind, s = lexer.scan()
+    end = base + istream.offset
+    if kind == 'identifier':
+        keyword = KeywordToken._KINDS.get(s)
+        if keyword is None:
+            if IdentifierToken._regex.fullmatch(s) is None:
+                IdentifierToken(s, buffer.location(start), buffer.location(end))
+            buffer.append(IdentifierToken, None, s, start, end)
+        else:
+            buffer.append(KeywordToken, keyword, s, start, end)
+    elif kind == 'number':
+        token_type = NumberLexer.literal_type(s)
+        if token_type is None:
+            IntegerToken(s, buffer.location(start), buffer.location(end))
+        buffer.append(token_type, None, s, start, end)
+    elif kind == 'comment':
+        buffer.append(CommentToken, None, s, start, end)
+    else:
+        symbol = SymbolToken._KINDS.get(s)
+        if symbol is None:
+            SymbolToken(s, buffer.location(start), buffer.location(end))
+        buffer.append(SymbolToken, symbol, s, start, end)
+    return True
+
+
+def tokenize_all(istream: StreamBase) -> TokenBuffer:
+    buffer = TokenBuffer(istream)
+    lexer = RegexLexer(istream)
+    while _append_next(buffer, lexer):
+        pass
+    buffer._length = istream.offset
+    return buffer
+
+
+def relex(buffer: TokenBuffer, start: Integral, end: Integral, text: str) -> TokenBuffer:
+    # The buffer is updated in place and returned; it is left untouched if the new text fails to lex
+    old_stream = buffer.istream
+    if not isinstance(old_stream, StringStream):
+        raise TypeError('Incremental lexing requires a StringStream, not {}'.format(type(old_stream).__name__))
+    delta = len(text) - (end - start)
+
+    # Tokens ending before the edit cannot change, since the character that terminated them is untouched
+    lo, hi = 0, len(buffer)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if buffer.end(mid) < start:
+            lo = mid + 1
+        else:
+            hi = mid
+    first = lo
+    begin = buffer.end(first - 1) if first > 0 else 0
+
+    istream = old_stream._edit(start, end, text)
+    length = istream._length
+    size = 2 * (start + len(text) - begin) + 256
+    while True:
+        # Only a window of the new text is lexed. Tokens and spaces that come too close to its end may continue
+        # past it, so the window grows until relexing resynchronizes or reaches the end of the text
+        window_end = min(begin + size, length)
+        window = StringStream(istream._slice(begin, window_end))
+        tokens = TokenBuffer(istream)
+        tokens._texts = buffer._texts
+        tokens._text_ids = buffer._text_ids
+        lexer = RegexLexer(window)
+        resume = len(buffer)
+        old = first
+        complete = True
+        try:
+            while True:
+                try:
+                    lexer.skip_spaces()
+                except StopIteration:
+                    complete = window_end == length
+                    break
+                offset = begin + window.offset
+                if window_end < length and offset + _LOOKAHEAD > window_end:
+                    complete = False
+                    break
+                # Relex until a new token starts exactly where an old token after the edit did; the rest is unchanged
+                if offset >= start + len(text):
+                    while old < len(buffer) and (buffer.start(old) < end or buffer.start(old) + delta < offset):
+                        old += 1
+                    if old < len(buffer) and buffer.start(old) + delta == offset:
+                        resume = old
+                        break
+                _append_next(tokens, lexer, begin)
+        except SyntacticalError:
+            # A token cut off by the end of the window may look malformed
+            if window_end == length:
+                raise
+            complete = False
+        if complete:
+            break
+        size *= 4
+
+    buffer._splice(first, resume, tokens, delta)
+    buffer._istream = istream
+    return buffer
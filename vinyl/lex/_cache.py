@@ -0,0 +1,172 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from numbers import Integral
+from typing import Optional
+from ._stream import StringStream
+from ._buffer import TokenBuffer, tokenize_all
+
+__all__ = [
+    'TokenCache'
+]
+
+
+class TokenCache(object):
+    VERSION = 1
+    _MAGIC = b'VTOK'
+    # magic, version, token count, text count, text pool size, source length
+    _HEADER = struct.Struct('<4sHxxQQQQ')
+    _SUFFIX = '.tokens'
+    # Eviction trims the directory to this fraction of max_size, so the stores after it do not evict again at once
+    _LOW_WATER = 0.75
+    # Arrays are stored in native layout, so the layout is part of the key
+    _FORMAT = '{}:{}:{}:{}'.format(VERSION, sys.byteorder, array('l').itemsize, len(TokenBuffer._TYPES)).encode()
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def max_size(self) -> Integral:
+        return self._max_size
+
+    def __init__(self, directory: str, max_size: Integral=256 * 1024 * 1024):
+        super().__init__()
+        self._directory = directory
+        self._max_size = max_size
+        # Estimated total size of the entries, kept up to date by store() so it need not list the directory
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source: bytes) -> str:
+        digest = hashlib.sha256(self._FORMAT)
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key + self._SUFFIX)
+
+    def load(self, source: bytes) -> Optional[TokenBuffer]:
+        path = self._path(self.key(source))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        istream = StringStream(source.decode('utf-8'))
+        try:
+            buffer = self._decode(data, istream)
+        except UnicodeDecodeError:
+            buffer = None
+        if buffer is None:
+            # A truncated or corrupt entry counts as a miss and is removed, so the next store replaces it
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            else:
+                if self._size is not None:
+                    self._size -= len(data)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return buffer
+
+    def store(self, source: bytes, buffer: TokenBuffer):
+        data = self._encode(buffer)
+        fd, temp = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp, self._path(self.key(source)))
+        except BaseException:
+            os.unlink(temp)
+            raise
+        # Other processes may share the directory, so the estimate is corrected whenever evict() lists it
+        if self._size is None:
+            self.evict()
+        else:
+            self._size += len(data)
+            if self._size > self._max_size:
+                self.evict()
+
+    def tokenize(self, source: bytes) -> TokenBuffer:
+        buffer = self.load(source)
+        if buffer is None:
+            buffer = tokenize_all(StringStream(source.decode('utf-8')))
+            self.store(source, buffer)
+        return buffer
+
+    def tokenize_file(self, path: str) -> TokenBuffer:
+        with open(path, 'rb') as f:
+            return self.tokenize(f.read())
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self._directory):
+            if not name.endswith(self._SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self._directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        if total > self._max_size:
+            entries.sort()
+            for _, size, name in entries:
+                if total <= self._max_size * self._LOW_WATER:
+                    break
+                try:
+                    os.unlink(os.path.join(self._directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._size = total
+
+    @classmethod
+    def _encode(cls, buffer: TokenBuffer) -> bytes:
+        codes, starts, ends, values = (buffer._section(column, 0, len(buffer), shifted)
+                                       for column, shifted in buffer._columns())
+        texts = [text.encode('utf-8') for text in buffer._texts]
+        lengths = array('q', (len(text) for text in texts))
+        pool = b''.join(texts)
+        header = cls._HEADER.pack(cls._MAGIC, cls.VERSION, len(buffer), len(texts), len(pool), buffer._length)
+        return b''.join([header, codes.tobytes(), starts.tobytes(), ends.tobytes(),
+                         values.tobytes(), lengths.tobytes(), pool])
+
+    @classmethod
+    def _decode(cls, data: bytes, istream: StringStream) -> Optional[TokenBuffer]:
+        if len(data) < cls._HEADER.size:
+            return None
+        magic, version, count, text_count, pool_size, length = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC or version != cls.VERSION:
+            return None
+        buffer = TokenBuffer(istream)
+        lengths = array('q')
+        sections = [(values, count) for values, _ in buffer._columns()] + [(lengths, text_count)]
+        # Checked before reading anything, so a truncated entry is a miss rather than an error
+        if cls._HEADER.size + sum(values.itemsize * size for values, size in sections) + pool_size != len(data):
+            return None
+        view = memoryview(data)
+        offset = cls._HEADER.size
+        for values, size in sections:
+            end = offset + size * values.itemsize
+            values.frombytes(view[offset:end])
+            offset = end
+        if sum(lengths) != pool_size:
+            return None
+        texts = []
+        for size in lengths:
+            texts.append(str(view[offset:offset + size], 'utf-8'))
+            offset += size
+        buffer._texts = texts
+        buffer._text_ids = {text: index for index, text in enumerate(texts)}
+        buffer._length = length
+        return buffer
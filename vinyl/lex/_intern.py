@@ -0,0 +1,35 @@
+from numbers import Integral
+from typing import Optional, Sized
+
+__all__ = [
+    'InternTable'
+]
+
+
+class InternTable(Sized):
+    def __init__(self):
+        super().__init__()
+        self._ids = dict()
+        self._names = []
+
+    def add(self, name: str) -> Integral:
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def get(self, name: str) -> Optional[Integral]:
+        return self._ids.get(name)
+
+    def intern(self, name: str) -> str:
+        return self._names[self.add(name)]
+
+    def name(self, name_id: Integral) -> str:
+        return self._names[name_id]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def __len__(self) -> Integral:
+        return len(self._names)
@@ -1,5 +1,11 @@
+import re
 from abc import ABC, abstractmethod
-from typing import Iterator
+from collections import deque
+from enum import Enum
+from functools import partial
+from numbers import Integral
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from ._intern import *
 from ._token import *
 from ._stream import *
 
@@ -7,6 +13,7 @@ __all__ = [
     'BaseLexer',
     'PeekLexer',
     'Lexer',
+    'RegexLexer',
     'NumberLexer',
     'IdentifierLexer',
     'SymbolLexer',
@@ -14,15 +21,105 @@ __all__ = [
 ]
 
 
+def _build_trie(kinds: Iterable[Enum]) -> Dict[Optional[str], Any]:
+    trie = {}
+    for kind in kinds:
+        node = trie
+        for c in kind.value:
+            node = node.setdefault(c, {})
+        node[None] = kind
+    return trie
+
+
 class BaseLexer(ABC, Iterator[BaseToken]):
+    @property
+    def istream(self) -> StreamBase:
+        return self._istream
+
+    @property
+    def trailing_trivia(self) -> Tuple[BaseToken, ...]:
+        return self._trailing_trivia
+
+    @property
+    def names(self) -> InternTable:
+        # Created on first use, so the per-token sub-lexers never allocate a table of their own
+        if self._names is None:
+            self._names = InternTable()
+        return self._names
+
     def skip_spaces(self):
-        self._istream.read_until(Matchers.is_not_space)
+        self._istream.skip_until(Matchers.is_not_space)
         if self._istream.ended:
             raise StopIteration
 
-    def __init__(self, istream: StreamBase):
+    def skip_trivia(self) -> Tuple[BaseToken, ...]:
+        if not self._trivia and not self._skip_comments:
+            self.skip_spaces()
+            return ()
+        trivia = []
+        while True:
+            if self._trivia:
+                start_location = self._istream.location
+                s = self._istream.read_until(Matchers.is_not_space)
+                if s:
+                    trivia.append(WhitespaceToken(s, start_location, self._istream.location))
+            else:
+                self._istream.skip_until(Matchers.is_not_space)
+            if self._istream.ended:
+                self._trailing_trivia = tuple(trivia)
+                raise StopIteration
+            c = self._istream.peek(2)
+            if c not in ('//', '/*'):
+                return tuple(trivia)
+            if self._trivia:
+                trivia.append(next(CommentLexer(self._istream)))
+            elif c == '/*':
+                self._istream.skip_until(Matchers.is_comment_terminator)
+                self._istream.skip()
+            else:
+                self._istream.skip_until(Matcher.exactly('\n'))
+
+    def _skip_block(self, start: Integral) -> Optional[Integral]:
+        # Moves past the block whose opening brace is at offset start without lexing it, and returns where it ends.
+        # Only text held in memory can be scanned and read again later; None leaves the lexer where it was
+        if not isinstance(self._istream, StringStream) or self._trivia:
+            return None
+        depth = 0
+        for m in _BLOCK_SCANNER.finditer(self._istream._string, start):
+            if m.group('brace') is not None:
+                depth += 1 if m.group('brace') == '{' else -1
+                if depth == 0:
+                    self._istream._set_offset(m.end())
+                    return m.end()
+        return None
+
+    def _relex_block(self, start: Integral, end: Integral) -> Tuple[List[BaseToken], BaseException]:
+        # The tokens of a skipped block, and the error to raise after them
+        offset = self._istream.offset
+        self._istream._set_offset(start)
+        tokens = []
+        try:
+            while self._istream.offset < end:
+                tokens.append(next(self))
+        except SyntacticalError as e:
+            return tokens, e
+        finally:
+            self._istream._set_offset(offset)
+        return tokens, StopIteration()
+
+    def __init__(self,
+                 istream: StreamBase,
+                 lazy_literals: bool=False,
+                 skip_comments: bool=False,
+                 trivia: bool=False,
+                 names: InternTable=None):
         super().__init__()
         self._istream = istream
+        self._lazy_literals = lazy_literals
+        self._skip_comments = skip_comments
+        self._trivia = trivia
+        self._trailing_trivia = ()
+        self._names = names
 
     def __iter__(self) -> Iterator[BaseToken]:
         return self
@@ -36,105 +133,229 @@ class PeekLexer(Iterator[BaseToken]):
     def __init__(self, lexer: BaseLexer):
         self._lexer = lexer
         self._exception = None
-        self._read_next()
+        # Tokens from absolute index _base onwards that are still ahead or pinned by a mark
+        self._tokens = deque()
+        self._base = 0
+        self._position = 0
+        self._marks = {}
 
     def __iter__(self) -> Iterator[BaseToken]:
         return self
 
     def __next__(self) -> BaseToken:
-        if self._exception is not None:
+        if not self._fill(0):
             raise self._exception
-        if self._token is None:
-            raise StopIteration()
-        tok = self._token
-        self._read_next()
+        tok = self._tokens[self._position - self._base]
+        self._position += 1
+        self._release()
         return tok
 
-    def _read_next(self):
-        while True:
+    def _fill(self, k: Integral) -> bool:
+        while self._exception is None and self._base + len(self._tokens) <= self._position + k:
             try:
-                self._token = next(self._lexer)
-                if not isinstance(self._token, CommentToken):
-                    break
+                token = next(self._lexer)
+                if not isinstance(token, CommentToken):
+                    self._tokens.append(token)
             except BaseException as e:
-                self._token = None
                 self._exception = e
-                break
+        return self._position + k < self._base + len(self._tokens)
+
+    def _release(self):
+        oldest = min(self._marks) if self._marks else self._position
+        while self._base < oldest:
+            self._tokens.popleft()
+            self._base += 1
 
     @classmethod
-    def from_stream(cls, istream: StreamBase):
-        return cls(Lexer(istream))
+    def from_stream(cls, istream: StreamBase, lexer_type: Callable[..., BaseLexer]=None, **options):
+        options.setdefault('skip_comments', True)
+        return cls((lexer_type or Lexer)(istream, **options))
+
+    @property
+    def istream(self) -> StreamBase:
+        return self._lexer.istream
+
+    @property
+    def names(self) -> InternTable:
+        return self._lexer.names
 
     def read(self) -> BaseToken:
         return next(self)
 
-    def peek(self) -> BaseToken:
-        if isinstance(self._exception, StopIteration):
-            return None
-        if self._exception is not None:
+    def peek(self, k: Integral=0) -> BaseToken:
+        if not self._fill(k):
+            if isinstance(self._exception, StopIteration):
+                return None
             raise self._exception
-        return self._token
+        return self._tokens[self._position + k - self._base]
+
+    def _skip_block(self) -> Optional[Callable[[], Tuple[List[BaseToken], BaseException]]]:
+        # Skips the block opening at the next token if nothing after it has been read ahead, and returns how to
+        # lex it again
+        token = self.peek()
+        if self._base + len(self._tokens) != self._position + 1:
+            return None
+        start = token.start_location.offset
+        end = self._lexer._skip_block(start)
+        if end is None:
+            return None
+        self._position += 1
+        self._release()
+        return partial(self._lexer._relex_block, start, end)
+
+    @property
+    def position(self) -> Integral:
+        return self._position
+
+    def mark(self) -> Integral:
+        self._marks[self._position] = self._marks.get(self._position, 0) + 1
+        return self._position
+
+    def reset(self, mark: Integral):
+        if mark not in self._marks:
+            raise ValueError('Position {} is not marked'.format(mark))
+        self._position = mark
+
+    def release(self, mark: Integral):
+        count = self._marks.pop(mark)
+        if count > 1:
+            self._marks[mark] = count - 1
+        self._release()
 
 
 class Lexer(BaseLexer):
     def __next__(self) -> BaseToken:
-        self.skip_spaces()
+        trivia = self.skip_trivia()
         c = self._istream.peek()
         if c.isdigit():
-            return next(NumberLexer(self._istream))
+            token = next(NumberLexer(self._istream, self._lazy_literals))
         elif c.isidentifier():
-            return next(IdentifierLexer(self._istream))
+            token = next(IdentifierLexer(self._istream, names=self.names))
         elif self._istream.peek(2) in ['//', '/*']:
-            return next(CommentLexer(self._istream))
-        return next(SymbolLexer(self._istream))
+            token = next(CommentLexer(self._istream))
+        else:
+            token = next(SymbolLexer(self._istream))
+        if trivia:
+            token._leading_trivia = trivia
+        return token
+
+
+class RegexLexer(BaseLexer):
+    _SYMBOLS = sorted((kind.value for kind in SymbolTokenKind), key=len, reverse=True)
+    # An unterminated block comment runs to the end of the input, and '/*/' is a complete one
+    _COMMENT = r'//[^\n]*|/(?=\*)(?:[\s\S]*?\*/|[\s\S]*)'
+    _PATTERN = re.compile('|'.join([
+        # Only ASCII starts are matched here; \d and \w disagree with str.isdigit and str.isidentifier beyond ASCII
+        r'(?P<number>[0-9]{})'.format(Matchers.is_number_separator.pattern.pattern),
+        r'(?P<identifier>[A-Za-z_]{})'.format(Matchers.is_separator.pattern.pattern),
+        r'(?P<comment>{})'.format(_COMMENT),
+        r'(?P<symbol>{})'.format('|'.join(re.escape(symbol) for symbol in _SYMBOLS))
+    ]))
+
+    def scan(self) -> Tuple[Optional[str], str]:
+        m = self._istream.match(self._PATTERN)
+        if m is None:
+            c = self._istream.peek()
+            if c.isdigit():
+                return 'number', self._istream.read_until(Matchers.is_number_separator)
+            elif c.isidentifier():
+                return 'identifier', self._istream.read_until(Matchers.is_separator)
+            return None, self._istream.read(1)
+        return m.lastgroup, self._istream.read(len(m.group()))
+
+    def __next__(self) -> BaseToken:
+        trivia = self.skip_trivia()
+        start_location = self._istream.location
+        kind, s = self.scan()
+        end_location = self._istream.location
+        if kind == 'number':
+            token = NumberLexer.create_token(s, start_location, end_location, self._lazy_literals)
+        elif kind == 'identifier':
+            token = IdentifierLexer.create_token(s, start_location, end_location, self.names)
+        elif kind == 'comment':
+            token = CommentToken(s, start_location, end_location)
+        else:
+            token = SymbolToken(s, start_location, end_location)
+        if trivia:
+            token._leading_trivia = trivia
+        return token
 
 
-class NumberLexer(Iterator[NumberTokenBase], BaseLexer):
+_BLOCK_SCANNER = re.compile('{}|(?P<brace>[{{}}])'.format(RegexLexer._COMMENT))
+
+
+class NumberLexer(BaseLexer):
+    _CLASSIFIER = re.compile('(?P<float>{}|{})|{}|{}|{}'.format(
+        FloatToken._regex1.pattern,
+        FloatToken._regex2.pattern,
+        IntegerToken._regex2.pattern,
+        IntegerToken._regex10.pattern,
+        IntegerToken._regex16.pattern))
+
     def __next__(self) -> NumberTokenBase:
         self.skip_spaces()
         start_location = self._istream.location
         s = self._istream.read_until(Matchers.is_number_separator)
         end_location = self._istream.location
-        try:
-            return FloatToken(s, start_location, end_location)
-        except SyntacticalError:
+        return self.create_token(s, start_location, end_location, self._lazy_literals)
+
+    @staticmethod
+    def literal_type(s: str) -> Optional[type(NumberTokenBase)]:
+        m = NumberLexer._CLASSIFIER.fullmatch(s.replace('_', '').lower())
+        if m is None:
+            return None
+        return FloatToken if m.group('float') is not None else IntegerToken
+
+    @staticmethod
+    def create_token(s: str, start_location: Location, end_location: Location, lazy: bool=False) -> NumberTokenBase:
+        token_type = NumberLexer.literal_type(s)
+        if token_type is None:
+            # Malformed literals are rejected by IntegerToken, as before
             return IntegerToken(s, start_location, end_location)
+        return token_type(s, start_location, end_location, lazy)
 
 
-class IdentifierLexer(Iterator[IdentifierToken], BaseLexer):
+class IdentifierLexer(BaseLexer):
     def __next__(self) -> IdentifierToken:
         self.skip_spaces()
         start_location = self._istream.location
         s = self._istream.read_until(Matchers.is_separator)
         end_location = self._istream.location
-        try:
-            return KeywordToken(s, start_location, end_location)
-        except SyntacticalError:
-            return IdentifierToken(s, start_location, end_location)
+        return self.create_token(s, start_location, end_location, self.names)
+
+    @staticmethod
+    def create_token(s: str, start_location: Location, end_location: Location, names: InternTable=None) -> BaseToken:
+        kind = KeywordToken._KINDS.get(s)
+        if kind is not None:
+            return KeywordToken(kind.value, start_location, end_location)
+        token = IdentifierToken(s, start_location, end_location)
+        if names is not None:
+            token.intern(names)
+        return token
 
 
-class SymbolLexer(Iterator[SymbolToken], BaseLexer):
+class SymbolLexer(BaseLexer):
     _LONGEST_SYMBOL = max(SymbolTokenKind, key=lambda sym: len(sym.value))
+    _TRIE = _build_trie(SymbolTokenKind)
 
     def __next__(self) -> SymbolToken:
         self.skip_spaces()
         start_location = self._istream.location
-        for i in range(len(self._LONGEST_SYMBOL.value), 0, -1):
-            s = self._istream.peek(i)
-            try:
-                SymbolToken(s, Location(), Location())
-                s = self._istream.read(i)
-                end_location = self._istream.location
-                return SymbolToken(s, start_location, end_location)
-            except SyntacticalError:
-                continue
-        # Give up and raise the exception
-        s = self._istream.read(1)
+        node = self._TRIE
+        length = 0
+        for i, c in enumerate(self._istream.peek(len(self._LONGEST_SYMBOL.value))):
+            node = node.get(c)
+            if node is None:
+                break
+            if None in node:
+                length = i + 1
+        # An unknown symbol is read as a single character and rejected by SymbolToken
+        s = self._istream.read(length or 1)
         end_location = self._istream.location
         return SymbolToken(s, start_location, end_location)
 
 
-class CommentLexer(Iterator[CommentToken], BaseLexer):
+class CommentLexer(BaseLexer):
     def __next__(self) -> NumberTokenBase:
         self.skip_spaces()
         start_location = self._istream.location
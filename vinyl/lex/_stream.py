@@ -1,33 +1,101 @@
+import codecs
 import io
+import mmap
 import os
+import re
 from abc import ABC, abstractmethod
-from copy import copy
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
 from numbers import Integral
-from typing import Callable, Optional, Generic, TypeVar, Dict
+from typing import Callable, Optional, Generic, TypeVar, Iterator, List, Mapping, Tuple, Pattern, Match, Union
 
 
 __all__ = [
     'StreamBase',
     'Location',
+    'Matcher',
+    'LineMap',
     'IOType',
     'IOWrapperStream',
-    'StringStream'
+    'StringStream',
+    'MmapStream',
+    'ReaderStream',
+    'ChunkStream'
 ]
 
 
 class Location(object):
+    __slots__ = ('_line', '_column', '_offset', '_istream')
+
     @property
     def line(self) -> Integral:
+        if self._istream is not None:
+            self._resolve()
         return self._line
 
     @property
     def column(self) -> Integral:
+        if self._istream is not None:
+            self._resolve()
         return self._column
 
-    def __init__(self, line: Integral=1, column: Integral=1):
+    @property
+    def offset(self) -> Optional[Integral]:
+        return self._offset
+
+    def __init__(self, line: Integral=1, column: Integral=1, offset: Optional[Integral]=None):
         super().__init__()
         self._line = line
         self._column = column
+        self._offset = offset
+        self._istream = None
+
+    @classmethod
+    def _deferred(cls, istream: 'StreamBase', offset: Integral) -> 'Location':
+        location = cls.__new__(cls)
+        location._offset = offset
+        location._istream = istream
+        return location
+
+    def _resolve(self):
+        self._line, self._column = self._istream._position_at(self._offset)
+        self._istream = None
+
+    def __reduce__(self):
+        return type(self), (self.line, self.column, self._offset)
+
+    def __repr__(self) -> str:
+        return '{}(line={},column={})'.format(type(self).__name__, self.line, self.column)
+
+
+class Matcher(object):
+    @property
+    def pattern(self) -> Pattern:
+        return self._pattern
+
+    @property
+    def bytes_pattern(self) -> Pattern:
+        return self._bytes_pattern
+
+    @property
+    def bytes_safe(self) -> bool:
+        return self._bytes_safe
+
+    def __init__(self, pattern: str, predicate: Callable[[Optional[str], str], bool], bytes_safe: bool=False):
+        super().__init__()
+        self._pattern = re.compile(pattern)
+        self._bytes_pattern = re.compile(pattern.encode('utf-8'))
+        self._predicate = predicate
+        self._bytes_safe = bytes_safe
+
+    def __call__(self, prev: Optional[str], c: str) -> bool:
+        return self._predicate(prev, c)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def exactly(c: str) -> 'Matcher':
+        return Matcher('[^{}]*'.format(re.escape(c)), lambda p, n: n == c, c < '\x80')
 
 
 class StreamBase(ABC):
@@ -52,22 +120,34 @@ class StreamBase(ABC):
         return True
 
     @property
-    def line_map(self) -> Dict[Integral, str]:
+    def line_map(self) -> 'LineMap':
         return self._line_map
 
     def read(self, n: Integral=1) -> str:
-        s = self._read_raw(n)
-        for c in s:
-            self._line_buffer += c
-            self._line_map[self._location._line] = self._line_buffer
-            if c == '\n':
-                self._line_buffer = ''
-                self._location._line += 1
-                self._location._column = 1
-            else:
-                self._location._column += 1
+        start = self.offset
+        return self._advance(self._read_raw(n), start)
+
+    def _advance(self, s: str, start: Integral) -> str:
+        i = s.find('\n')
+        while i != -1:
+            self._line_starts.append(start + i + 1)
+            i = s.find('\n', i + 1)
         return s
 
+    def _column_width(self, start: Integral, end: Integral) -> Integral:
+        return end - start
+
+    def _line_text(self, start: Integral) -> str:
+        offset = self.offset
+        self._set_offset(start)
+        text = ''
+        c = self._read_raw(1)
+        while c and c != '\n':
+            text += c
+            c = self._read_raw(1)
+        self._set_offset(offset)
+        return text
+
     def read_until(self, until: UntilMatcher) -> str:
         offset = self.offset
         prev = None
@@ -81,7 +161,13 @@ class StreamBase(ABC):
         return self.read(length)
 
     def read_until_exactly(self, c: str) -> str:
-        return self.read_until(lambda p, n: n == c)
+        return self.read_until(Matcher.exactly(c))
+
+    def skip(self, n: Integral=1):
+        self.read(n)
+
+    def skip_until(self, until: UntilMatcher):
+        self.read_until(until)
 
     def peek(self, n: Integral=1) -> str:
         offset = self.offset
@@ -89,23 +175,63 @@ class StreamBase(ABC):
         self._set_offset(offset)
         return s
 
+    def match(self, pattern: Pattern) -> Optional[Match]:
+        n = 256
+        while True:
+            window = self.peek(n)
+            m = pattern.match(window)
+            if m is None or m.end() < len(window) or len(window) < n:
+                return m
+            n *= 4
+
     @property
     def line(self) -> Integral:
-        return self._location._line
+        return self._dropped_lines + len(self._line_starts)
 
     @property
     def column(self) -> Integral:
-        return self._location._column
+        return self._column_width(self._line_starts[-1], self.offset) + 1
 
     @property
     def location(self) -> Location:
-        return copy(self._location)
+        return Location._deferred(self, self.offset)
+
+    def location_at(self, offset: Integral) -> Location:
+        line, column = self._position_at(offset)
+        return Location(line, column, offset)
+
+    def _position_at(self, offset: Integral) -> Tuple[Integral, Integral]:
+        index = bisect_right(self._line_starts, offset)
+        if index == 0:
+            raise ValueError('Offset {} precedes the retained line index'.format(offset))
+        column = self._column_width(self._line_starts[index - 1], offset) + 1
+        return self._dropped_lines + index, column
 
     def __init__(self):
         super().__init__()
-        self._location = Location()
-        self._line_buffer = ''
-        self._line_map = dict()
+        self._line_starts = array('q', [0])
+        self._dropped_lines = 0
+        self._line_map = LineMap(self)
+
+
+class LineMap(Mapping[Integral, str]):
+    def __init__(self, istream: StreamBase):
+        super().__init__()
+        self._istream = istream
+
+    def __getitem__(self, line: Integral) -> str:
+        starts = self._istream._line_starts
+        index = line - self._istream._dropped_lines - 1
+        if not 0 <= index < len(starts):
+            raise KeyError(line)
+        return self._istream._line_text(starts[index])
+
+    def __len__(self) -> Integral:
+        return len(self._istream._line_starts)
+
+    def __iter__(self) -> Iterator[Integral]:
+        first = self._istream._dropped_lines + 1
+        return iter(range(first, first + len(self)))
 
 
 IOType = TypeVar('IOType', io.RawIOBase, io.BufferedIOBase, io.TextIOBase)
@@ -139,6 +265,509 @@ class IOWrapperStream(StreamBase, Generic[IOType]):
         self._codeio = codeio
 
 
-class StringStream(IOWrapperStream):
+class StringStream(StreamBase):
+    def _read_raw(self, n: Integral=1) -> str:
+        offset = self._offset
+        self._offset = min(offset + n, self._length)
+        return self._string[offset:self._offset]
+
+    def _set_offset(self, value: Integral=1):
+        self._offset = value
+
+    @property
+    def offset(self) -> Integral:
+        return self._offset
+
+    @property
+    def ended(self) -> bool:
+        return self._offset >= self._length
+
+    @property
+    def string(self) -> str:
+        return self._string
+
+    def read_until(self, until: StreamBase.UntilMatcher) -> str:
+        if isinstance(until, Matcher):
+            return self.read(until.pattern.match(self._string, self._offset).end() - self._offset)
+        string = self._string
+        end = self._offset
+        prev = None
+        while end < self._length:
+            c = string[end]
+            if until(prev, c):
+                break
+            prev = c
+            end += 1
+        return self.read(end - self._offset)
+
+    def skip(self, n: Integral=1):
+        self._offset = min(self._offset + n, self._length)
+        self._index_lines(self._offset)
+
+    def skip_until(self, until: StreamBase.UntilMatcher):
+        if isinstance(until, Matcher):
+            self._offset = until.pattern.match(self._string, self._offset).end()
+            self._index_lines(self._offset)
+        else:
+            self.read_until(until)
+
+    def peek(self, n: Integral=1) -> str:
+        return self._string[self._offset:self._offset + n]
+
+    def match(self, pattern: Pattern) -> Optional[Match]:
+        return pattern.match(self._string, self._offset)
+
+    def _line_text(self, start: Integral) -> str:
+        end = self._string.find('\n', start)
+        return self._string[start:end if end != -1 else self._length]
+
+    def _slice(self, start: Integral, end: Integral) -> str:
+        return self._string[start:end]
+
+    def _pieces(self) -> Tuple[List[Tuple[str, Integral, Integral]], array]:
+        return [(self._string, 0, self._length)], array('q', [0])
+
+    def _edit(self, start: Integral, end: Integral, text: str) -> 'StringStream':
+        # The new stream shares this one's text and takes over its line index, which this one rebuilds if needed
+        delta = len(text) - (end - start)
+        pieces, offsets = self._pieces()
+        first = bisect_right(offsets, start) - 1
+        last = bisect_right(offsets, end) - 1
+        string, lo, hi = pieces[first]
+        middle = [(string, lo, lo + start - offsets[first]), (text, 0, len(text))]
+        string, lo, hi = pieces[last]
+        middle.append((string, lo + end - offsets[last], hi))
+        middle = [piece for piece in middle if piece[1] < piece[2]]
+        middle_offsets = array('q')
+        offset = offsets[first]
+        for _, lo, hi in middle:
+            middle_offsets.append(offset)
+            offset += hi - lo
+        istream = _EditedStream(pieces[:first] + middle + pieces[last + 1:],
+                                offsets[:first] + middle_offsets + array('q', (o + delta for o in offsets[last + 1:])),
+                                self._length + delta)
+
+        lines = self._line_starts
+        if not isinstance(lines, _LineStarts):
+            lines = _LineStarts(lines)
+        if self._indexed < end:
+            # Line starts past the edit were never indexed, so they are found again when first needed
+            lines.splice(bisect_right(lines, start), len(lines), array('q'), 0)
+            istream._indexed = min(self._indexed, start)
+        else:
+            added = array('q')
+            i = text.find('\n')
+            while i != -1:
+                added.append(start + i + 1)
+                i = text.find('\n', i + 1)
+            lines.splice(bisect_right(lines, start), bisect_right(lines, end), added, delta)
+            istream._indexed = self._indexed + delta
+        istream._line_starts = lines
+        self._line_starts = array('q', [0])
+        self._indexed = 0
+        return istream
+
+    def _advance(self, s: str, start: Integral) -> str:
+        self._index_lines(start + len(s))
+        return s
+
+    def _index_lines(self, end: Integral):
+        # Line starts are recorded up to the furthest offset consumed or resolved, so the cursor may jump ahead
+        if end <= self._indexed:
+            return
+        string = self._string
+        i = string.find('\n', self._indexed, end)
+        while i != -1:
+            self._line_starts.append(i + 1)
+            i = string.find('\n', i + 1, end)
+        self._indexed = end
+
+    @property
+    def line(self) -> Integral:
+        return self._position_at(self._offset)[0]
+
+    @property
+    def column(self) -> Integral:
+        return self._position_at(self._offset)[1]
+
+    def _position_at(self, offset: Integral) -> Tuple[Integral, Integral]:
+        self._index_lines(offset)
+        return super()._position_at(offset)
+
     def __init__(self, string: str):
-        super().__init__(io.StringIO(string))
+        super().__init__()
+        self._string = string
+        self._length = len(string)
+        self._offset = 0
+        self._indexed = 0
+
+    @classmethod
+    def from_io(cls, codeio: io.TextIOBase) -> 'StringStream':
+        return cls(codeio.read())
+
+    @classmethod
+    def from_file(cls, path: str, encoding: str='utf-8') -> 'StringStream':
+        with open(path, encoding=encoding) as f:
+            return cls.from_io(f)
+
+
+class _LineStarts(object):
+    # A gap of _gap_size free slots follows the first _gap line starts. Starts after it are stored without _shift,
+    # so an edit only touches the lines it replaces, as in TokenBuffer
+    def __init__(self, starts: array):
+        super().__init__()
+        self._starts = starts
+        self._gap = len(starts)
+        self._gap_size = 0
+        self._shift = 0
+
+    def append(self, value: Integral):
+        self._starts.append(value - self._shift)
+
+    def _move_gap(self, index: Integral):
+        starts, gap, size, shift = self._starts, self._gap, self._gap_size, self._shift
+        if index < gap and (size or shift):
+            block = starts[index:gap]
+            if shift:
+                block = array('q', (value - shift for value in block))
+            starts[index + size:gap + size] = block
+        elif index > gap and (size or shift):
+            block = starts[gap + size:index + size]
+            if shift:
+                block = array('q', (value + shift for value in block))
+            starts[gap:index] = block
+        self._gap = index
+
+    def splice(self, first: Integral, last: Integral, starts: array, delta: Integral):
+        # Replaces line starts [first, last) with new ones and moves every later start by delta
+        self._move_gap(first)
+        self._gap_size += last - first
+        count = len(starts)
+        if self._gap_size < count:
+            extra = max(count - self._gap_size, len(self._starts))
+            self._starts[self._gap:self._gap] = array('q', bytes(8 * extra))
+            self._gap_size += extra
+        self._starts[self._gap:self._gap + count] = starts
+        self._gap += count
+        self._gap_size -= count
+        self._shift += delta
+        if self._gap >= len(self):
+            del self._starts[self._gap:]
+            self._gap_size = self._shift = 0
+
+    def __len__(self) -> Integral:
+        return len(self._starts) - self._gap_size
+
+    def __getitem__(self, index: Integral) -> Integral:
+        if index < 0:
+            index += len(self)
+        if index >= self._gap:
+            return self._starts[index + self._gap_size] + self._shift
+        return self._starts[index]
+
+
+class _EditedStream(StringStream):
+    # The text after an edit, kept as slices of the texts it was made from until it is read through the stream
+    _MAX_PIECES = 256
+
+    @property
+    def _string(self) -> str:
+        if self._joined is None:
+            self._joined = self._slice(0, self._length)
+            self._piece_list, self._piece_offsets = [(self._joined, 0, self._length)], array('q', [0])
+        return self._joined
+
+    def _spans(self, start: Integral, end: Integral) -> Iterator[Tuple[str, Integral, Integral, Integral]]:
+        # Yields each piece overlapping [start, end) as its string, the bounds within it and the offset they start at
+        index = max(bisect_right(self._piece_offsets, start) - 1, 0)
+        while start < end and index < len(self._piece_list):
+            string, lo, hi = self._piece_list[index]
+            offset = self._piece_offsets[index]
+            yield string, lo + start - offset, min(hi, lo + end - offset), start
+            start = offset + hi - lo
+            index += 1
+
+    def _slice(self, start: Integral, end: Integral) -> str:
+        return ''.join(string[lo:hi] for string, lo, hi, _ in self._spans(start, min(end, self._length)))
+
+    def _pieces(self) -> Tuple[List[Tuple[str, Integral, Integral]], array]:
+        return self._piece_list, self._piece_offsets
+
+    def _line_text(self, start: Integral) -> str:
+        parts = []
+        for string, lo, hi, _ in self._spans(start, self._length):
+            end = string.find('\n', lo, hi)
+            parts.append(string[lo:end if end != -1 else hi])
+            if end != -1:
+                break
+        return ''.join(parts)
+
+    def _index_lines(self, end: Integral):
+        if end <= self._indexed:
+            return
+        for string, lo, hi, offset in self._spans(self._indexed, end):
+            i = string.find('\n', lo, hi)
+            while i != -1:
+                self._line_starts.append(offset + i - lo + 1)
+                i = string.find('\n', i + 1, hi)
+        self._indexed = end
+
+    def __init__(self, pieces: List[Tuple[str, Integral, Integral]], offsets: array, length: Integral):
+        StreamBase.__init__(self)
+        self._joined = None
+        if len(pieces) > self._MAX_PIECES:
+            joined = ''.join(string[lo:hi] for string, lo, hi in pieces)
+            pieces, offsets = [(joined, 0, length)], array('q', [0])
+        self._piece_list = pieces or [('', 0, 0)]
+        self._piece_offsets = offsets or array('q', [0])
+        self._length = length
+        self._offset = 0
+        self._indexed = 0
+
+
+class MmapStream(StreamBase):
+    _NON_ASCII = re.compile(b'[\x80-\xff]')
+
+    def _char_length(self, offset: Integral) -> Integral:
+        b = self._mmap[offset]
+        if b < 0xc0:
+            return 1
+        elif b < 0xe0:
+            return 2
+        elif b < 0xf0:
+            return 3
+        return 4
+
+    def _span(self, n: Integral) -> Integral:
+        end = min(self._offset + n, self._size)
+        if self._NON_ASCII.search(self._mmap, self._offset, end) is None:
+            return end
+        end = self._offset
+        while n > 0 and end < self._size:
+            end += self._char_length(end)
+            n -= 1
+        return min(end, self._size)
+
+    def _decode(self, start: Integral, end: Integral) -> str:
+        return self._mmap[start:end].decode('utf-8', 'replace')
+
+    def _read_raw(self, n: Integral=1) -> str:
+        start = self._offset
+        self._offset = self._span(n)
+        return self._decode(start, self._offset)
+
+    def _set_offset(self, value: Integral=1):
+        self._offset = value
+
+    @property
+    def offset(self) -> Integral:
+        return self._offset
+
+    @property
+    def ended(self) -> bool:
+        return self._offset >= self._size
+
+    def read_until(self, until: StreamBase.UntilMatcher) -> str:
+        mm = self._mmap
+        end = self._offset
+        if isinstance(until, Matcher):
+            end = until.bytes_pattern.match(mm, end).end()
+            if until.bytes_safe or self._NON_ASCII.search(mm, self._offset, min(end + 1, self._size)) is None:
+                return self._consume_to(end)
+            end = self._offset
+        prev = None
+        while end < self._size:
+            b = mm[end]
+            if b < 0x80:
+                length = 1
+                c = chr(b)
+            else:
+                length = self._char_length(end)
+                c = self._decode(end, end + length)
+            if until(prev, c):
+                break
+            prev = c
+            end += length
+        return self._consume_to(end)
+
+    def _consume_to(self, end: Integral) -> str:
+        start = self._offset
+        self._offset = end
+        return self._advance(self._decode(start, end), start)
+
+    def _advance(self, s: str, start: Integral) -> str:
+        i = self._mmap.find(b'\n', start, self._offset)
+        while i != -1:
+            self._line_starts.append(i + 1)
+            i = self._mmap.find(b'\n', i + 1, self._offset)
+        return s
+
+    def _column_width(self, start: Integral, end: Integral) -> Integral:
+        # Columns are mostly asked for in increasing order, so carry on from the last one on the same line
+        line_start, last, width = self._last_column
+        if line_start != start or last > end:
+            last, width = start, 0
+        if self._NON_ASCII.search(self._mmap, last, end) is None:
+            width += end - last
+        else:
+            width += len(self._decode(last, end))
+        self._last_column = (start, end, width)
+        return width
+
+    def _line_text(self, start: Integral) -> str:
+        end = self._mmap.find(b'\n', start)
+        return self._decode(start, end if end != -1 else self._size)
+
+    def peek(self, n: Integral=1) -> str:
+        return self._decode(self._offset, self._span(n))
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+    def __init__(self, fileobj: io.IOBase):
+        super().__init__()
+        self._offset = 0
+        self._last_column = (0, 0, 0)
+        self._size = os.fstat(fileobj.fileno()).st_size
+        if self._size == 0:
+            self._mmap = b''
+        else:
+            self._mmap = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'MmapStream':
+        with open(path, 'rb') as f:
+            return cls(f)
+
+
+class ReaderStream(StreamBase):
+    def _fill(self, end: Integral):
+        while not self._eof and self._buffer_offset + len(self._buffer) < end:
+            chunk = self._reader.read(self._chunk_size)
+            if not chunk:
+                self._eof = True
+            if isinstance(chunk, bytes):
+                chunk = self._decoder.decode(chunk, self._eof)
+            self._buffer += chunk
+
+    def _compact(self):
+        start = self._line_starts[-1]
+        if start - self._buffer_offset < self._chunk_size:
+            return
+        self._buffer = self._buffer[start - self._buffer_offset:]
+        self._buffer_offset = start
+        self._dropped_lines += len(self._line_starts) - 1
+        del self._line_starts[:-1]
+
+    def _read_raw(self, n: Integral=1) -> str:
+        s = self.peek(n)
+        self._offset += len(s)
+        return s
+
+    def _set_offset(self, value: Integral=1):
+        if value < self._buffer_offset:
+            raise ValueError('Cannot seek to {} before the buffered window'.format(value))
+        self._fill(value)
+        self._offset = min(value, self._buffer_offset + len(self._buffer))
+
+    @property
+    def offset(self) -> Integral:
+        return self._offset
+
+    @property
+    def ended(self) -> bool:
+        self._fill(self._offset + 1)
+        return self._offset >= self._buffer_offset + len(self._buffer)
+
+    def _advance(self, s: str, start: Integral) -> str:
+        s = super()._advance(s, start)
+        self._compact()
+        return s
+
+    @property
+    def location(self) -> Location:
+        return Location(self.line, self.column, self._offset)
+
+    def _line_text(self, start: Integral) -> str:
+        index = start - self._buffer_offset
+        end = self._buffer.find('\n', index)
+        while end == -1 and not self._eof:
+            self._fill(self._buffer_offset + len(self._buffer) + 1)
+            end = self._buffer.find('\n', index)
+        return self._buffer[index:end if end != -1 else len(self._buffer)]
+
+    def read_until(self, until: StreamBase.UntilMatcher) -> str:
+        index = self._offset - self._buffer_offset
+        if isinstance(until, Matcher):
+            end = until.pattern.match(self._buffer, index).end()
+            while end == len(self._buffer) and not self._eof:
+                self._fill(self._buffer_offset + len(self._buffer) + 1)
+                end = until.pattern.match(self._buffer, index).end()
+            return self.read(end - index)
+        prev = None
+        while True:
+            if index >= len(self._buffer):
+                self._fill(self._buffer_offset + index + 1)
+                if index >= len(self._buffer):
+                    break
+            c = self._buffer[index]
+            if until(prev, c):
+                break
+            prev = c
+            index += 1
+        return self.read(self._buffer_offset + index - self._offset)
+
+    def peek(self, n: Integral=1) -> str:
+        self._fill(self._offset + n)
+        index = self._offset - self._buffer_offset
+        return self._buffer[index:index + n]
+
+    def __init__(self, reader: IOType, chunk_size: Integral=65536):
+        super().__init__()
+        self._reader = reader
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._buffer = ''
+        self._buffer_offset = 0
+        self._offset = 0
+        self._eof = False
+
+
+class ChunkStream(ReaderStream):
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    @property
+    def available(self) -> Integral:
+        return self._buffer_offset + len(self._buffer)
+
+    def feed(self, data: Union[bytes, str]):
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        self._buffer += data
+
+    def feed_eof(self):
+        self._buffer += self._decoder.decode(b'', True)
+        self._finished = True
+
+    def checkpoint(self) -> Tuple[Integral, Integral]:
+        return self._offset, len(self._line_starts)
+
+    def rollback(self, checkpoint: Tuple[Integral, Integral]):
+        self._offset, lines = checkpoint
+        del self._line_starts[lines:]
+
+    def commit(self):
+        super()._compact()
+
+    def _compact(self):
+        # Only compact at commit points, so rollbacks never reach before the window
+        pass
+
+    def __init__(self, chunk_size: Integral=65536):
+        super().__init__(None, chunk_size)
+        # Nothing more can be read synchronously than what has been fed so far
+        self._eof = True
+        self._finished = False
@@ -2,8 +2,10 @@ import re
 from abc import ABC, abstractmethod
 from enum import Enum, IntEnum, unique
 from numbers import Integral, Real
-from typing import Optional
-from ._stream import Location, StreamBase
+from types import MappingProxyType
+from typing import Optional, Tuple
+from ._intern import InternTable
+from ._stream import Location, Matcher, StreamBase
 
 __all__ = [
     'SymbolTokenKind',
@@ -20,7 +22,8 @@ __all__ = [
     'IdentifierToken',
     'SymbolToken',
     'KeywordToken',
-    'CommentToken'
+    'CommentToken',
+    'WhitespaceToken'
 ]
 
 
@@ -92,27 +95,29 @@ class IntegerBase(IntEnum):
 
 class Matchers(ABC):
     _SEPARATORS = {enum.value[0] for enum in SymbolTokenKind}
+    _SEPARATOR_CLASS = ''.join(re.escape(c) for c in sorted(_SEPARATORS))
 
-    @staticmethod
-    def is_number_separator(prev: Optional[str], c: str) -> bool:
-        if prev is not None and prev in 'eE' and c in '+-':
-            return False
-        return Matchers.is_separator(prev, c)
+    is_number_separator = Matcher(
+        r'(?:[eE][+-]|[^\s{}])*'.format(_SEPARATOR_CLASS),
+        lambda prev, c: not (prev is not None and prev in 'eE' and c in '+-') and Matchers.is_separator(prev, c))
 
-    @staticmethod
-    def is_separator(prev: Optional[str], c: str) -> bool:
-        return c.isspace() or c in Matchers._SEPARATORS
+    is_separator = Matcher(
+        r'[^\s{}]*'.format(_SEPARATOR_CLASS),
+        lambda prev, c: c.isspace() or c in Matchers._SEPARATORS)
 
-    @staticmethod
-    def is_not_space(prev: Optional[str], c: str) -> bool:
-        return not c.isspace()
+    is_not_space = Matcher(
+        r'\s*',
+        lambda prev, c: not c.isspace())
 
-    @staticmethod
-    def is_comment_terminator(prev: Optional[str], c: str) -> bool:
-        return prev == '*' and c == '/'
+    is_comment_terminator = Matcher(
+        r'(?s)(?:.*?\*(?=/)|.*)',
+        lambda prev, c: prev == '*' and c == '/',
+        bytes_safe=True)
 
 
 class BaseToken(ABC):
+    __slots__ = ('_text', '_start_location', '_end_location', '_leading_trivia')
+
     @property
     def start_location(self) -> Location:
         return self._start_location
@@ -125,6 +130,10 @@ class BaseToken(ABC):
     def text(self) -> str:
         return self._text
 
+    @property
+    def leading_trivia(self) -> Tuple['BaseToken', ...]:
+        return self._leading_trivia
+
     @staticmethod
     @abstractmethod
     def short_name() -> str:
@@ -135,6 +144,23 @@ class BaseToken(ABC):
         self._text = text
         self._start_location = start_location
         self._end_location = end_location
+        self._leading_trivia = ()
+
+    def relocate(self, istream: StreamBase, delta: Integral=0):
+        self._start_location = Location._deferred(istream, self._start_location.offset + delta)
+        self._end_location = Location._deferred(istream, self._end_location.offset + delta)
+        for trivia in self._leading_trivia:
+            trivia.relocate(istream, delta)
+
+    def shift(self, lines: Integral, columns: Integral, delta: Integral):
+        # Columns only move on the first line, for text that began partway into a line
+        locations = []
+        for location in (self._start_location, self._end_location):
+            column = location.column + columns if location.line == 1 else location.column
+            locations.append(Location(location.line + lines, column, location.offset + delta))
+        self._start_location, self._end_location = locations
+        for trivia in self._leading_trivia:
+            trivia.shift(lines, columns, delta)
 
     def __eq__(self, other: 'BaseToken') -> bool:
         if type(self) is not type(other):
@@ -164,12 +190,26 @@ class SyntacticalError(Exception):
 
 
 class NumberTokenBase(BaseToken):
-    def __init__(self, text: str, start_location: Location, end_location: Location):
+    __slots__ = ('_clean_text',)
+
+    @property
+    def decoded(self) -> bool:
+        return self._clean_text is not None
+
+    def __init__(self, text: str, start_location: Location, end_location: Location, lazy: bool=False):
         super().__init__(text, start_location, end_location)
-        self._clean_text = text.replace('_', '').lower()
+        self._clean_text = None
+        if not lazy:
+            self._decode()
+
+    @abstractmethod
+    def _decode(self):
+        pass
 
 
 class IntegerToken(NumberTokenBase):
+    __slots__ = ('_kind', '_value', '_base')
+
     _regex2 = re.compile(r'0b([0-1]+)(i8|u8|i16|u16|i32|u32|i64|u64|i|u)?')
     _regex8 = re.compile(r'0c([0-7]+)(i8|u8|i16|u16|i32|u32|i64|u64|i|u)?')
     _regex10 = re.compile(r'([0-9]+)(i8|u8|i16|u16|i32|u32|i64|u64|i|u)?')
@@ -177,34 +217,40 @@ class IntegerToken(NumberTokenBase):
 
     @property
     def kind(self) -> IntegerKind:
+        if self._clean_text is None:
+            self._decode()
         return self._kind
 
     @property
     def value(self) -> Integral:
+        if self._clean_text is None:
+            self._decode()
         return self._value
 
     @property
     def base(self) -> IntegerBase:
+        if self._clean_text is None:
+            self._decode()
         return self._base
 
     @staticmethod
     def short_name() -> str:
         return 'integer literal'
 
-    def __init__(self, text: str, start_location: Location, end_location: Location):
-        super().__init__(text, start_location, end_location)
-        if self._clean_text.startswith('0b'):
+    def _decode(self):
+        clean_text = self._text.replace('_', '').lower()
+        if clean_text.startswith('0b'):
             self._base = IntegerBase.base2
-            m = re.fullmatch(self._regex2, self._clean_text)
-        elif self._clean_text.startswith('0o'):
+            m = re.fullmatch(self._regex2, clean_text)
+        elif clean_text.startswith('0o'):
             self._base = IntegerBase.base8
-            m = re.fullmatch(self._regex8, self._clean_text)
-        elif self._clean_text.startswith('0x'):
+            m = re.fullmatch(self._regex8, clean_text)
+        elif clean_text.startswith('0x'):
             self._base = IntegerBase.base16
-            m = re.fullmatch(self._regex16, self._clean_text)
+            m = re.fullmatch(self._regex16, clean_text)
         else:
             self._base = IntegerBase.base10
-            m = re.fullmatch(self._regex10, self._clean_text)
+            m = re.fullmatch(self._regex10, clean_text)
         if m is None:
             raise SyntacticalError(self, 'Malformed {}'.format(self.short_name()))
         self._value = int(m.group(1), self._base.value)
@@ -213,41 +259,48 @@ class IntegerToken(NumberTokenBase):
             self._kind = IntegerKind(suffix)
         else:
             self._kind = IntegerKind.NONE
+        self._clean_text = clean_text
 
     def __repr__(self) -> str:
-        return '{}(value={},kind={},base={})'.format(type(self).__name__, self._value, self._kind, self._base)
+        return '{}(value={},kind={},base={})'.format(type(self).__name__, self.value, self.kind, self.base)
 
     def __eq__(self, other: 'IntegerToken') -> bool:
         if not super().__eq__(other):
             return False
-        if self._kind is not other._kind:
+        if self.kind is not other.kind:
             return False
-        if self._base is not other._base:
+        if self.base is not other.base:
             return False
-        return self._value == other._value
+        return self.value == other.value
 
 
 class FloatToken(NumberTokenBase):
+    __slots__ = ('_kind', '_value')
+
     _regex1 = re.compile(r'([0-9]+\.[0-9]*(?:e[+-]?[0-9]+)?)(f32|f64)?')
     _regex2 = re.compile(r'([0-9]+e[+-]?[0-9]+)(f32|f64)?')
 
     @property
     def kind(self) -> FloatKind:
+        if self._clean_text is None:
+            self._decode()
         return self._kind
 
     @property
     def value(self) -> Real:
+        if self._clean_text is None:
+            self._decode()
         return self._value
 
     @staticmethod
     def short_name() -> str:
         return 'floating point literal'
 
-    def __init__(self, text: str, start_location: Location, end_location: Location):
-        super().__init__(text, start_location, end_location)
-        m = re.fullmatch(self._regex1, self._clean_text)
+    def _decode(self):
+        clean_text = self._text.replace('_', '').lower()
+        m = re.fullmatch(self._regex1, clean_text)
         if m is None:
-            m = re.fullmatch(self._regex2, self._clean_text)
+            m = re.fullmatch(self._regex2, clean_text)
         if m is None:
             raise SyntacticalError(self, 'Malformed {}'.format(self.short_name()))
         self._value = float(m.group(1))
@@ -256,33 +309,54 @@ class FloatToken(NumberTokenBase):
             self._kind = FloatKind(suffix)
         else:
             self._kind = FloatKind.NONE
+        self._clean_text = clean_text
 
     def __repr__(self) -> str:
-        return '{}(value={},kind={})'.format(type(self).__name__, self._value, self._kind)
+        return '{}(value={},kind={})'.format(type(self).__name__, self.value, self.kind)
 
     def __eq__(self, other: 'FloatToken') -> bool:
         if not super().__eq__(other):
             return False
-        if self._kind is not other._kind:
+        if self.kind is not other.kind:
             return False
-        return self._value == other._value
+        return self.value == other.value
 
 
 class IdentifierToken(BaseToken):
+    __slots__ = ('_name_id', '_names')
+
     _regex = re.compile(r'\w+')
 
+    @property
+    def name_id(self) -> Optional[Integral]:
+        return self._name_id
+
+    @property
+    def names(self) -> Optional[InternTable]:
+        return self._names
+
     @staticmethod
     def short_name() -> str:
         return 'identifier'
 
     def __init__(self, text: str, start_location: Location, end_location: Location):
         super().__init__(text, start_location, end_location)
+        self._name_id = None
+        self._names = None
         m = re.fullmatch(self._regex, self._text)
         if m is None:
             raise SyntacticalError(self, 'Malformed {}'.format(self.short_name()))
 
+    def intern(self, names: InternTable):
+        self._name_id = names.add(self._text)
+        self._names = names
+        self._text = names.name(self._name_id)
+
 
 class KeywordToken(BaseToken):
+    __slots__ = ('_kind',)
+    _KINDS = MappingProxyType({kind.value: kind for kind in KeywordTokenKind})
+
     @property
     def kind(self) -> KeywordTokenKind:
         return self._kind
@@ -293,12 +367,8 @@ class KeywordToken(BaseToken):
 
     def __init__(self, text: str, start_location: Location, end_location: Location):
         super().__init__(text, start_location, end_location)
-        for kind in KeywordTokenKind:
-            if kind.value == self._text:
-                self._kind = kind
-                break
-        else:
-            self._kind = None
+        self._kind = self._KINDS.get(text)
+        if self._kind is None:
             raise SyntacticalError(self, 'Malformed {}'.format(self.short_name()))
 
     def __repr__(self) -> str:
@@ -306,6 +376,9 @@ class KeywordToken(BaseToken):
 
 
 class SymbolToken(BaseToken):
+    __slots__ = ('_kind',)
+    _KINDS = MappingProxyType({kind.value: kind for kind in SymbolTokenKind})
+
     @property
     def kind(self) -> SymbolTokenKind:
         return self._kind
@@ -316,21 +389,25 @@ class SymbolToken(BaseToken):
 
     def __init__(self, text: str, start_location: Location, end_location: Location):
         super().__init__(text, start_location, end_location)
-        for kind in SymbolTokenKind:
-            if kind.value == self._text:
-                self._kind = kind
-                break
-        else:
-            self._kind = None
-            raise SyntacticalError(self, 'Malformed {}'.format(self.short_name))
+        self._kind = self._KINDS.get(text)
+        if self._kind is None:
+            raise SyntacticalError(self, 'Malformed {}'.format(self.short_name()))
 
     def __repr__(self) -> str:
         return '{}(text=\'{}\',kind={})'.format(type(self).__name__, self._text, self._kind)
 
 
 class CommentToken(BaseToken):
+    __slots__ = ()
+
     @staticmethod
     def short_name() -> str:
         return 'comment'
 
-    pass
+
+class WhitespaceToken(BaseToken):
+    __slots__ = ()
+
+    @staticmethod
+    def short_name() -> str:
+        return 'whitespace'